@@ -0,0 +1,281 @@
+"""
+Dr. Freud AI Chatbot - Headless HTTP/JSON API
+Talks to Dr. Freud without the Streamlit UI, reusing the same agent pool,
+context window and conversation store.
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+"""
+
+import json
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent))
+
+# Local imports
+from src.config import AVAILABLE_MODELS, DEFAULT_MODEL_SETTINGS, TEXT_CONTENT
+from src.prompts import SYSTEM_PROMPT
+from src.agent_manager import build_message_history, summary_message, stream_agent_response_with_context
+from src.coalescing import TurnBusyError, session_turn
+from src.router import is_auto
+from src.context_manager import fold_history
+from src.metrics import start_metrics_server
+from src.conversation_store import get_conversation_store
+from src.preset_store import get_preset_store
+from src.session_manager import estimate_tokens
+from src.warmup import warm_session
+
+# Load environment variables
+load_dotenv()
+
+class ApiError(Exception):
+    """Error returned to the client as {"error": message} with a status code."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+async def _read_json(request):
+    """Read the request body as a JSON object."""
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object")
+    return body
+
+def _get_text(body, field):
+    """Get an optional text field of a body, or None if it is missing."""
+    value = body.get(field)
+    if value is not None and not (isinstance(value, str) and value):
+        raise ApiError(400, f"\"{field}\" must be a non-empty string")
+    return value
+
+def _get_flag(body, field, default):
+    """Get an optional boolean field of a body."""
+    value = body.get(field, default)
+    if not isinstance(value, bool):
+        raise ApiError(400, f"\"{field}\" must be true or false")
+    return value
+
+def _resolve_prompt(body):
+    """Get the system prompt from a body with "prompt" or "preset" (default persona otherwise)."""
+    prompt = _get_text(body, "prompt")
+    preset = _get_text(body, "preset")
+    if prompt is not None:
+        return prompt
+    if preset is not None:
+        prompt = get_preset_store().get(preset)
+        if not prompt:
+            raise ApiError(404, f"Unknown preset: {preset}")
+        return prompt
+    return SYSTEM_PROMPT
+
+def _load_session(session_id):
+    session = get_conversation_store().load_session(session_id)
+    if session is None:
+        raise ApiError(404, f"Unknown session: {session_id}")
+    return session
+
+def _get_context(session_id, session, model_name):
+    """Build the message history for the next turn, like get_context_window does."""
+    store = get_conversation_store()
+    start = session["summarized_until"]
+    messages = store.load_messages(session_id, start)
+    summary, _, folded = fold_history(
+        model_name,
+        messages,
+        [estimate_tokens(msg["content"]) for msg in messages],
+        session["summary"],
+        estimate_tokens(session["summary"]) if session["summary"] else 0,
+        0
+    )
+    if folded:
+        store.save_summary(session_id, summary, start + folded)
+    history = build_message_history(messages[folded:])
+    if summary:
+        return [summary_message(summary)] + history
+    return history
+
+def _chat_turn(session_id, body):
+    """Run one turn; yields ("delta", text) items and finally ("done", usage), or ("error", usage) if it failed."""
+    content = _get_text(body, "content")
+    if content is None:
+        raise ApiError(400, "Message needs non-empty \"content\"")
+    model_name = _get_text(body, "model") or DEFAULT_MODEL_SETTINGS["model_name"]
+    if model_name not in AVAILABLE_MODELS and not is_auto(model_name):
+        raise ApiError(400, f"Unknown model: {model_name}")
+    temperature = body.get("temperature", DEFAULT_MODEL_SETTINGS["temperature"])
+    if isinstance(temperature, bool) or not isinstance(temperature, (int, float)):
+        raise ApiError(400, "\"temperature\" must be a number")
+    temperature = float(temperature)
+    enable_web_search = _get_flag(body, "web_search", DEFAULT_MODEL_SETTINGS["enable_web_search"])
+
+    # Fail fast on unknown sessions, before any response is started
+    _load_session(session_id)
+
+    def turn():
+        # Load, reply and persist as one exclusive turn, so concurrent
+        # messages to the same session never write the same positions
+        with session_turn(session_id) as is_current:
+            session = _load_session(session_id)
+            history = _get_context(session_id, session, model_name)
+            position = session["message_count"]
+
+            usage = {}
+            chunks = []
+            for chunk in stream_agent_response_with_context(
+                model_name, temperature, enable_web_search, session["prompt"], content, history,
+                on_usage=usage.update, budget_key=session_id
+            ):
+                if not is_current():
+                    # A newer message superseded this one; it is not persisted
+                    yield "done", dict(usage, superseded=True)
+                    return
+                if "error" in usage:
+                    # The upstream request failed or the budget is used up;
+                    # the apology or refusal that follows and any partial
+                    # reply are not persisted
+                    yield "error", usage
+                    return
+                chunks.append(chunk)
+                yield "delta", chunk
+
+            store = get_conversation_store()
+            store.append_message(session_id, position, "user", content)
+            store.append_message(session_id, position + 1, "assistant", "".join(chunks))
+            yield "done", usage
+
+    return turn()
+
+def _warm_up(prompt):
+    """Prepare the agent for a new session's first message in the background."""
+    warm_session(
+        DEFAULT_MODEL_SETTINGS["model_name"],
+        DEFAULT_MODEL_SETTINGS["temperature"],
+        DEFAULT_MODEL_SETTINGS["enable_web_search"],
+        prompt
+    )
+
+def _create_session(body):
+    """Create a session for a body's prompt or preset; returns its ID."""
+    prompt = _resolve_prompt(body)
+    session_id = get_conversation_store().create_session(prompt)
+    _warm_up(prompt)
+    return session_id
+
+def _load_messages(session_id):
+    _load_session(session_id)
+    return get_conversation_store().load_messages(session_id)
+
+def _list_presets():
+    return get_preset_store().list_names()
+
+# The stores block on SQLite and files, so handlers call them in the
+# thread pool, never on the event loop
+
+async def create_session(request):
+    """POST /api/sessions {"prompt"?, "preset"?} -> {"session_id"}"""
+    body = await _read_json(request) if await request.body() else {}
+    session_id = await run_in_threadpool(_create_session, body)
+    return JSONResponse({"session_id": session_id}, status_code=201)
+
+async def get_session(request):
+    """GET /api/sessions/{session_id} -> {"session_id", "messages"}"""
+    session_id = request.path_params["session_id"]
+    messages = await run_in_threadpool(_load_messages, session_id)
+    return JSONResponse({"session_id": session_id, "messages": messages})
+
+async def post_message(request):
+    """POST /api/sessions/{session_id}/messages {"content", "model"?, "temperature"?, "web_search"?, "stream"?}
+
+    Returns {"reply", "usage"}, or server-sent events ("delta" events, then
+    one "done" event with the usage) when "stream" is true. Messages to the
+    same session are answered one at a time; 409 if the previous one does
+    not finish within COALESCING_CONFIG["turn_timeout"]. 502 if the model
+    could not answer, 429 if a budget is used up (or an "error" event when
+    streaming); the message is then not saved.
+    """
+    session_id = request.path_params["session_id"]
+    body = await _read_json(request)
+    stream = _get_flag(body, "stream", False)
+    # Validation reads the conversation store, so it runs off the event
+    # loop like the turn itself
+    turn = await run_in_threadpool(_chat_turn, session_id, body)
+
+    if stream:
+        def events():
+            try:
+                for kind, data in turn:
+                    if kind == "delta":
+                        payload = {"delta": data}
+                    elif kind == "error" and data.get("budget") == "exhausted":
+                        payload = {"error": TEXT_CONTENT["budget_exhausted"], "usage": data}
+                    elif kind == "error":
+                        payload = {"error": data["error"], "usage": data}
+                    else:
+                        payload = {"usage": data}
+                    yield f"event: {kind}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            except TurnBusyError as e:
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    try:
+        items = await run_in_threadpool(list, turn)
+    except TurnBusyError as e:
+        raise ApiError(409, str(e))
+    kind, usage = items[-1]
+    if kind == "error" and usage.get("budget") == "exhausted":
+        raise ApiError(429, TEXT_CONTENT["budget_exhausted"])
+    if kind == "error":
+        raise ApiError(502, f"Model request failed: {usage['error']}")
+    reply = "".join(data for kind, data in items if kind == "delta")
+    return JSONResponse({"reply": reply, "usage": usage})
+
+async def apply_prompt(request):
+    """POST /api/sessions/{session_id}/prompt {"prompt" | "preset"} -> {"session_id"}
+
+    Like the editor's apply button, a new prompt starts a fresh conversation.
+    """
+    await run_in_threadpool(_load_session, request.path_params["session_id"])
+    body = await _read_json(request)
+    if body.get("prompt") is None and body.get("preset") is None:
+        raise ApiError(400, "Body needs \"prompt\" or \"preset\"")
+    session_id = await run_in_threadpool(_create_session, body)
+    return JSONResponse({"session_id": session_id}, status_code=201)
+
+async def list_presets(request):
+    """GET /api/presets -> {"presets": [names]}"""
+    return JSONResponse({"presets": await run_in_threadpool(_list_presets)})
+
+async def api_error(request, exc):
+    return JSONResponse({"error": exc.message}, status_code=exc.status_code)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Export API turns on /metrics, like the UI does (once per process)
+    start_metrics_server()
+    yield
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route("/api/sessions", create_session, methods=["POST"]),
+        Route("/api/sessions/{session_id}", get_session, methods=["GET"]),
+        Route("/api/sessions/{session_id}/messages", post_message, methods=["POST"]),
+        Route("/api/sessions/{session_id}/prompt", apply_prompt, methods=["POST"]),
+        Route("/api/presets", list_presets, methods=["GET"])
+    ],
+    exception_handlers={ApiError: api_error}
+)
@@ -16,34 +16,50 @@ sys.path.append(str(Path(__file__).parent))
 # Local imports
 from src.config import PAGE_CONFIG, TEXT_CONTENT
 from src.styles import get_main_styles, get_header_visibility_styles
+from src.assets import get_background_css
 from src.session_manager import (
     initialize_session_state, 
-    update_model_settings, 
-    update_prompt
+    update_model_settings
 )
 from src.ui_components import (
     show_settings, 
     show_header, 
     show_chat_interface, 
     show_header_toggle,
+    show_prompt_panel,
     show_agent_memory_log
 )
-from src.edit_system_prompt import show_prompt_editor
+from src.metrics import start_metrics_server
+from src.session_lifecycle import session_run, start_session_reaper
 
-# Load environment variables
-load_dotenv()
+# Streamlit re-executes this script on every rerun, so once-per-process
+# work lives behind cache_resource instead of at module level
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """Load environment variables from .env once per process."""
+    load_dotenv()
 
+@session_run
 def main():
     """Main application function."""
     # Set page config first to prevent layout shift
     st.set_page_config(**PAGE_CONFIG)
 
+    # Load environment variables
+    load_environment()
+
     # Apply main styles
-    st.markdown(get_main_styles(), unsafe_allow_html=True)
+    st.markdown(get_main_styles(get_background_css()), unsafe_allow_html=True)
 
     # Initialize session state
     initialize_session_state()
 
+    # Serve Prometheus metrics (started once per process)
+    start_metrics_server()
+
+    # Evict idle sessions from memory (started once per process)
+    start_session_reaper()
+
     # Create columns for chat and prompt editor
     col1, col2 = st.columns([2, 1])
 
@@ -61,13 +77,8 @@ def main():
     with col2:
         st.title(TEXT_CONTENT["psyche_title"])
         
-        # Get the updated prompt from the editor
-        updated_prompt = show_prompt_editor()
-        
-        # Update the current prompt and handle changes
-        if update_prompt(updated_prompt):
-            st.toast(TEXT_CONTENT["personality_updated"])
-            st.rerun()
+        # Prompt editor (reruns on its own while editing)
+        show_prompt_panel()
         
         # Header visibility toggle
         show_header_flag = show_header_toggle()
@@ -0,0 +1,156 @@
+"""
+Offline load test for the Dr. Freud chat path.
+Drives N concurrent synthetic sessions of M turns each through
+src/agent_manager.py against the mock Responses API, and reports throughput,
+latency percentiles and memory growth per session.
+
+Usage:
+    python benchmarks/bench_chat.py --sessions 50 --turns 10
+    python benchmarks/bench_chat.py --base-url http://127.0.0.1:8765/v1   # external mock
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import pickle
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.mock_openai_server import MockSettings, start_server
+
+USER_MESSAGES = (
+    "Hallo Dr. Freud",
+    "Sind Sie ein Vogel?",
+    "Ich habe schlecht geträumt.",
+    "Du bist doch ein Papagei!",
+    "Ich forsche im Bereich Mutationsbiologie.",
+    "Was halten Sie von Smartphones?"
+)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_session(session_id, turns, model_name, results):
+    """Run one synthetic session, keeping its history like session_manager does."""
+    from src.agent_manager import stream_agent_response_with_context, to_model_message
+    from src.prompts import SYSTEM_PROMPT
+
+    history = []
+    for turn in range(turns):
+        user_prompt = USER_MESSAGES[(session_id + turn) % len(USER_MESSAGES)]
+        start = time.perf_counter()
+        first_token = None
+        chunks = []
+        usage = {}
+        for chunk in stream_agent_response_with_context(model_name, 0.45, False, SYSTEM_PROMPT, user_prompt, list(history), on_usage=usage.update):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            chunks.append(chunk)
+        latency = time.perf_counter() - start
+
+        # Failed turns are not kept, as in the chat interface
+        if "error" not in usage:
+            history.append(to_model_message("user", user_prompt))
+            history.append(to_model_message("assistant", "".join(chunks)))
+        results["turns"].append({
+            "latency": latency,
+            "time_to_first_token": first_token or latency,
+            "error": "error" in usage
+        })
+    results["history_bytes"].append(len(pickle.dumps(history)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--base-url", help="Use an already running mock server instead of starting one")
+    parser.add_argument("--latency", type=float, default=MockSettings.latency)
+    parser.add_argument("--tokens-per-second", type=float, default=MockSettings.tokens_per_second)
+    parser.add_argument("--output-tokens", type=int, default=MockSettings.output_tokens)
+    parser.add_argument("--error-rate", type=float, default=MockSettings.error_rate)
+    parser.add_argument("--rate-limit", type=int, help="Override the engine's default requests per minute per model")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure heap growth with tracemalloc (slows the run down)")
+    args = parser.parse_args()
+
+    if args.base_url is None:
+        MockSettings.latency = args.latency
+        MockSettings.tokens_per_second = args.tokens_per_second
+        MockSettings.output_tokens = args.output_tokens
+        MockSettings.error_rate = args.error_rate
+        server = start_server()
+        args.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    # Must be set before the shared OpenAI client is created
+    os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    os.environ.setdefault("PYDANTIC_AI_NO_BANNER", "1")
+    logging.getLogger("drfreud.metrics").setLevel(logging.WARNING)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    from src.config import ENGINE_CONFIG, SHARED_STATE_CONFIG
+    # Mock turns are priced like real ones; keep their spend out of the
+    # store the chat replicas share, where it would use up real budgets
+    SHARED_STATE_CONFIG["backend"] = "memory"
+    if args.rate_limit:
+        ENGINE_CONFIG["rate_limits"]["default"] = args.rate_limit
+
+    # Warm up outside the measurement: imports, agent pool, shared client
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_session(0, 1, args.model, {"turns": [], "history_bytes": []})
+
+    results = {"turns": [], "history_bytes": []}
+    if args.trace_memory:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    threads = [
+        threading.Thread(target=run_session, args=(i, args.turns, args.model, results))
+        for i in range(args.sessions)
+    ]
+
+    start = time.perf_counter()
+    # Silence the chat path's [DEBUG] prints while the load runs
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    duration = time.perf_counter() - start
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss
+    tracemalloc.stop()
+
+    latencies = [turn["latency"] for turn in results["turns"]]
+    first_tokens = [turn["time_to_first_token"] for turn in results["turns"]]
+    errors = sum(turn["error"] for turn in results["turns"])
+
+    print(f"Sessions: {args.sessions}  Turns per session: {args.turns}  Mock: {args.base_url}")
+    print(f"Turns completed: {len(latencies)}  Errors: {errors}  Duration: {duration:.2f}s")
+    print(f"Throughput: {len(latencies) / duration:.1f} turns/s")
+    for name, values in (("Latency", latencies), ("Time to first token", first_tokens)):
+        print(
+            f"{name}: p50 {percentile(values, 0.5) * 1000:.0f} ms  "
+            f"p95 {percentile(values, 0.95) * 1000:.0f} ms  "
+            f"p99 {percentile(values, 0.99) * 1000:.0f} ms"
+        )
+    print(f"Peak RSS growth: {rss_growth / args.sessions:.1f} KiB per session")
+    if args.trace_memory:
+        print(f"Heap growth: {growth / args.sessions / 1024:.1f} KiB per session (tracemalloc)")
+    print(f"History size: {statistics.mean(results['history_bytes']) / 1024:.1f} KiB per session (pickled)")
+
+if __name__ == "__main__":
+    main()
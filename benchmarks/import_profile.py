@@ -0,0 +1,74 @@
+"""
+Import-time profile of the Streamlit entry point.
+Imports app.py in a fresh interpreter with `python -X importtime`, prints
+the slowest modules by cumulative import time, and fails if startup pulls
+in the LLM stack or exceeds a time budget, so cold start stays fast as
+dependencies grow.
+
+Usage:
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --top 30 --budget-ms 800
+    python benchmarks/import_profile.py --module api
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Deferred until the first chat turn or the background warm-up (see
+# src/warmup.py); importing them at startup is a regression
+DEFERRED_MODULES = ("pydantic_ai", "openai", "httpx", "src.agent_manager", "src.http_client", "src.resilience")
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def profile(module):
+    """Import a module in a fresh interpreter; returns [(module, self_us, cumulative_us, depth)]."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, help="Fail if the total import time exceeds this")
+    args = parser.parse_args()
+
+    entries = profile(args.module)
+    # Top-level imports (depth 0) add up to the total
+    total_ms = sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000
+    print(f"Import time of {args.module}: {total_ms:.0f} ms ({len(entries)} modules)")
+    print(f"{'Cumulative ms':>13} {'Self ms':>8}  Module")
+    for name, self_us, cumulative_us, _ in sorted(entries, key=lambda entry: -entry[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+
+    failures = []
+    imported = {name for name, _, _, _ in entries}
+    if args.module == "app":
+        eager = [name for name in DEFERRED_MODULES if name in imported]
+        if eager:
+            failures.append(f"imported at startup, should be deferred: {', '.join(eager)}")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.0f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
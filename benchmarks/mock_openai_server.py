@@ -0,0 +1,173 @@
+"""
+Fake OpenAI Responses API for offline benchmarks.
+Serves POST /v1/responses (plain and streaming) with configurable latency,
+token rate and error rate, so the chat path can be load-tested without an
+API key.
+
+Usage:
+    python benchmarks/mock_openai_server.py --port 8765 --latency 0.3 --tokens-per-second 80
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = (
+    "Was", "Sie", "da", "sagen,", "verrät", "mehr", "über", "Ihre", "Mutter",
+    "als", "über", "mich.", "Ich", "bin", "Dr.", "Freud,", "kein", "Vogel."
+)
+
+class MockSettings:
+    """Behaviour of the mock server, set from the command line."""
+    latency = 0.2
+    tokens_per_second = 100.0
+    output_tokens = 40
+    error_rate = 0.0
+
+def _reply_tokens():
+    """Generate the reply as a list of word tokens."""
+    return [
+        REPLY_WORDS[i % len(REPLY_WORDS)] + " "
+        for i in range(MockSettings.output_tokens)
+    ]
+
+def _usage(request_body, output_tokens):
+    """Rough usage figures based on the request size."""
+    input_tokens = len(json.dumps(request_body)) // 4
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": output_tokens,
+        "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": input_tokens + output_tokens
+    }
+
+def _message_item(message_id, text, status):
+    return {
+        "id": message_id,
+        "type": "message",
+        "role": "assistant",
+        "status": status,
+        "content": [{"type": "output_text", "text": text, "annotations": []}]
+    }
+
+def _response(response_id, model, status, output, usage=None):
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": status,
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": usage
+    }
+
+class MockResponsesHandler(BaseHTTPRequestHandler):
+    """Handles /v1/responses requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/responses"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        time.sleep(MockSettings.latency)
+        if random.random() < MockSettings.error_rate:
+            self._send_json(500, {"error": {"message": "Mock server error", "type": "server_error"}})
+            return
+
+        if body.get("stream"):
+            self._stream(body)
+        else:
+            tokens = _reply_tokens()
+            time.sleep(len(tokens) / MockSettings.tokens_per_second)
+            response_id = f"resp_{uuid.uuid4().hex}"
+            message = _message_item(f"msg_{uuid.uuid4().hex}", "".join(tokens), "completed")
+            self._send_json(200, _response(response_id, body.get("model"), "completed", [message], _usage(body, len(tokens))))
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, event):
+        data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, body):
+        """Send the reply as Responses API server-sent events."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        response_id = f"resp_{uuid.uuid4().hex}"
+        message_id = f"msg_{uuid.uuid4().hex}"
+        model = body.get("model")
+        tokens = _reply_tokens()
+        sequence = iter(range(1_000_000))
+
+        def event(event_type, **fields):
+            self._send_event({"type": event_type, "sequence_number": next(sequence), **fields})
+
+        event("response.created", response=_response(response_id, model, "in_progress", []))
+        event("response.output_item.added", output_index=0, item=_message_item(message_id, "", "in_progress") | {"content": []})
+        event("response.content_part.added", item_id=message_id, output_index=0, content_index=0,
+              part={"type": "output_text", "text": "", "annotations": []})
+        for token in tokens:
+            time.sleep(1 / MockSettings.tokens_per_second)
+            event("response.output_text.delta", item_id=message_id, output_index=0, content_index=0, delta=token, logprobs=[])
+
+        text = "".join(tokens)
+        event("response.output_text.done", item_id=message_id, output_index=0, content_index=0, text=text, logprobs=[])
+        event("response.content_part.done", item_id=message_id, output_index=0, content_index=0,
+              part={"type": "output_text", "text": text, "annotations": []})
+        message = _message_item(message_id, text, "completed")
+        event("response.output_item.done", output_index=0, item=message)
+        event("response.completed", response=_response(response_id, model, "completed", [message], _usage(body, len(tokens))))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(port=0):
+    """Start the mock server on a background thread; returns the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockResponsesHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=MockSettings.latency, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=MockSettings.tokens_per_second)
+    parser.add_argument("--output-tokens", type=int, default=MockSettings.output_tokens)
+    parser.add_argument("--error-rate", type=float, default=MockSettings.error_rate, help="Fraction of requests answered with HTTP 500")
+    args = parser.parse_args()
+
+    MockSettings.latency = args.latency
+    MockSettings.tokens_per_second = args.tokens_per_second
+    MockSettings.output_tokens = args.output_tokens
+    MockSettings.error_rate = args.error_rate
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), MockResponsesHandler)
+    print(f"Mock Responses API on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
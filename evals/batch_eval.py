@@ -0,0 +1,421 @@
+"""
+Batch evaluation of persona presets for the Dr. Freud chat path.
+Runs a corpus of single- or multi-turn conversations against one or more
+presets and models, appends one JSONL record per conversation and reports
+latency and token usage per preset and model.
+
+Corpus lines look like {"id": "dream", "turns": ["Ich habe schlecht geträumt.", ...]}.
+Presets are names from the preset store or paths to .txt files.
+
+Usage:
+    python evals/batch_eval.py --preset default --preset dr_freud --model gpt-4o-mini --model gpt-4.1-nano
+    python evals/batch_eval.py --preset presets/draft.txt --workers 16
+    python evals/batch_eval.py --batch          # OpenAI Batch API: cheaper, results within 24h
+    python evals/batch_eval.py --report-only
+
+Re-running with the same output file skips conversations that already
+finished (failed ones are retried), so an interrupted run resumes where it
+stopped. A preset edit changes its hash, so edited presets are re-run.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import AVAILABLE_MODELS, DEFAULT_MODEL_SETTINGS, EVAL_CONFIG, SHARED_STATE_CONFIG
+
+# Spend scope of eval turns; never counted against the chat budgets
+SPEND_SCOPE = "eval"
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def load_corpus(path):
+    """Load the corpus; a line with "message" instead of "turns" is a single turn."""
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            turns = case.get("turns") or [case["message"]]
+            cases.append({"id": str(case.get("id", number)), "turns": turns})
+    return cases
+
+def resolve_presets(names):
+    """Get (name, text) for each preset name or .txt path; all stored presets by default."""
+    from src.preset_store import get_preset_store
+
+    store = get_preset_store()
+    presets = []
+    for name in names or store.list_names():
+        path = Path(name)
+        if path.is_file():
+            presets.append((path.stem, path.read_text(encoding="utf-8")))
+            continue
+        text = store.get(name)
+        if not text:
+            sys.exit(f"Unknown preset: {name}")
+        presets.append((name, text))
+    return presets
+
+def make_jobs(presets, models, cases, temperature):
+    """One job per (preset, model, conversation)."""
+    from src.agent_manager import get_prompt_hash
+
+    jobs = []
+    for preset_name, prompt in presets:
+        prompt_hash = get_prompt_hash(prompt)
+        for model_name in models:
+            for case in cases:
+                jobs.append({
+                    "key": f"{preset_name}|{prompt_hash}|{model_name}|{temperature}|{case['id']}",
+                    "preset": preset_name,
+                    "preset_hash": prompt_hash,
+                    "prompt": prompt,
+                    "model": model_name,
+                    "case": case
+                })
+    return jobs
+
+def load_finished(output_path):
+    """Get the keys of conversations already finished without error."""
+    finished = set()
+    if not Path(output_path).exists():
+        return finished
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("error") is None:
+                    finished.add(record["key"])
+    return finished
+
+class ResultWriter:
+    """Appends records to the output file as they finish, safe across workers."""
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, job, turns, mode, error=None):
+        record = {
+            "key": job["key"],
+            "preset": job["preset"],
+            "preset_hash": job["preset_hash"],
+            "model": job["model"],
+            "case": job["case"]["id"],
+            "mode": mode,
+            "turns": turns,
+            "error": error,
+            "timestamp": time.time()
+        }
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def run_conversation(job, temperature):
+    """Play one scripted conversation through the engine; returns (turns, error)."""
+    from src import accounting, engine
+    from src.agent_manager import get_agent, get_usage_stats, to_model_message
+
+    # Bypasses the response cache and request coalescing on purpose: every
+    # turn is a real, measured model call
+    agent = get_agent(job["model"], temperature, False, job["prompt"])
+    if agent is None:
+        return [], "agent unavailable"
+    history = []
+    turns = []
+    for user_prompt in job["case"]["turns"]:
+        run_usage = []
+        messages = list(history)
+
+        async def agen():
+            async with agent.run_stream(user_prompt, message_history=messages or None) as response:
+                async for chunk in response.stream_text(delta=True):
+                    yield chunk
+                run_usage.append(response.usage)
+
+        timings = {}
+        start = time.perf_counter()
+        first_token = None
+        chunks = []
+        try:
+            for chunk in engine.stream(job["model"], agen, timings=timings):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                chunks.append(chunk)
+        except Exception as e:
+            return turns, f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start
+
+        reply = "".join(chunks)
+        usage = get_usage_stats(run_usage[0])
+        cost = accounting.record_usage(None, job["model"], usage, scope=SPEND_SCOPE)
+        turns.append({
+            "user": user_prompt,
+            "reply": reply,
+            "latency": latency,
+            "time_to_first_token": first_token if first_token is not None else latency,
+            "queue_wait": timings.get("queue_wait", 0.0),
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "cached_tokens": usage["cached_tokens"],
+            "cost": cost
+        })
+        history.append(to_model_message("user", user_prompt))
+        history.append(to_model_message("assistant", reply))
+    return turns, None
+
+def run_online(jobs, temperature, workers, writer):
+    """Run conversations in parallel through the chat engine."""
+    done = 0
+    lock = threading.Lock()
+
+    def work(job):
+        nonlocal done
+        turns, error = run_conversation(job, temperature)
+        writer.write(job, turns, "online", error)
+        with lock:
+            done += 1
+            print(f"[{done}/{len(jobs)}] {job['preset']} / {job['model']} / {job['case']['id']}" + (f": {error}" if error else ""), file=sys.stderr)
+
+    # Silence the chat path's [DEBUG] prints while the workers run
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(work, jobs))
+
+    from src.accounting import get_spend
+    spend = get_spend(scope=SPEND_SCOPE)[SPEND_SCOPE]
+    print(f"Spent {spend['tokens']} tokens, ${spend['cost']:.4f} at list prices", file=sys.stderr)
+
+def _custom_id(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def _batch_request(job, turns, temperature):
+    """Build one Batch API line asking for the next reply of a conversation."""
+    conversation = []
+    for turn in turns:
+        conversation.append({"role": "user", "content": turn["user"]})
+        conversation.append({"role": "assistant", "content": turn["reply"]})
+    conversation.append({"role": "user", "content": job["case"]["turns"][len(turns)]})
+    return {
+        "custom_id": _custom_id(job["key"]),
+        "method": "POST",
+        "url": "/v1/responses",
+        "body": {
+            "model": job["model"],
+            "instructions": job["prompt"],
+            "input": conversation,
+            "temperature": temperature,
+            "max_output_tokens": DEFAULT_MODEL_SETTINGS["max_tokens"],
+            "prompt_cache_key": f"drfreud-{job['preset_hash']}"
+        }
+    }
+
+def _parse_batch_line(line):
+    """Get (custom_id, turn fields, error) from one Batch API output line."""
+    result = json.loads(line)
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        error = result.get("error") or response.get("body", {}).get("error") or response.get("status_code")
+        return result["custom_id"], None, f"Batch request failed: {error}"
+    body = response["body"]
+    reply = "".join(
+        content.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for content in item.get("content", [])
+        if content.get("type") == "output_text"
+    )
+    usage = body.get("usage") or {}
+    return result["custom_id"], {
+        "reply": reply,
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cached_tokens": (usage.get("input_tokens_details") or {}).get("cached_tokens", 0)
+    }, None
+
+def run_batch(jobs, temperature, writer, state_path):
+    """Run conversations through the OpenAI Batch API, one batch per turn index.
+
+    Replies of earlier turns are needed to ask for the next one, so a
+    conversation with N turns takes N batches. Progress (the open batch and
+    the turns answered so far) is kept in state_path, so an interrupted run
+    picks the open batch up again instead of paying for it twice.
+    """
+    from openai import OpenAI
+
+    client = OpenAI()
+    state_path = Path(state_path)
+    state = json.loads(state_path.read_text()) if state_path.exists() else {"batch_id": None, "turns": {}}
+    by_id = {_custom_id(job["key"]): job for job in jobs}
+
+    def save():
+        state_path.write_text(json.dumps(state, ensure_ascii=False))
+
+    while True:
+        if state["batch_id"] is None:
+            pending = [
+                job for job in jobs
+                if len(state["turns"].get(job["key"], [])) < len(job["case"]["turns"])
+            ]
+            if not pending:
+                break
+            lines = "".join(
+                json.dumps(_batch_request(job, state["turns"].get(job["key"], []), temperature), ensure_ascii=False) + "\n"
+                for job in pending
+            )
+            upload = client.files.create(file=("batch_eval.jsonl", lines.encode("utf-8")), purpose="batch")
+            batch = client.batches.create(
+                input_file_id=upload.id,
+                endpoint="/v1/responses",
+                completion_window=EVAL_CONFIG["batch_completion_window"]
+            )
+            state["batch_id"] = batch.id
+            save()
+            print(f"Submitted batch {batch.id} with {len(pending)} requests", file=sys.stderr)
+
+        batch = client.batches.retrieve(state["batch_id"])
+        if batch.status not in ("completed", "failed", "expired", "cancelled"):
+            counts = batch.request_counts
+            print(f"Batch {batch.id}: {batch.status} ({counts.completed}/{counts.total})", file=sys.stderr)
+            time.sleep(EVAL_CONFIG["batch_poll_interval"])
+            continue
+        if batch.status == "failed":
+            state["batch_id"] = None
+            save()
+            sys.exit(f"Batch {batch.id} failed: {batch.errors}")
+
+        # Expired or cancelled batches still deliver the finished requests;
+        # the rest are asked again in the next batch
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                custom_id, turn, error = _parse_batch_line(line)
+                job = by_id.get(custom_id)
+                if job is None:
+                    continue
+                turns = state["turns"].setdefault(job["key"], [])
+                if error is not None:
+                    writer.write(job, turns, "batch", error)
+                    # Failed conversations are dropped from this run and
+                    # retried on the next one
+                    jobs.remove(job)
+                    state["turns"].pop(job["key"])
+                    continue
+                turns.append(dict(user=job["case"]["turns"][len(turns)], latency=None, time_to_first_token=None, queue_wait=None, **turn))
+                if len(turns) == len(job["case"]["turns"]):
+                    writer.write(job, turns, "batch")
+                    jobs.remove(job)
+                    state["turns"].pop(job["key"])
+        state["batch_id"] = None
+        save()
+
+    state_path.unlink(missing_ok=True)
+
+def report(output_path):
+    """Print latency and token usage per preset and model from the output file."""
+    groups = {}
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            group = groups.setdefault((record["preset"], record["preset_hash"], record["model"]), {"records": {}, "errors": 0})
+            if record["error"] is not None:
+                group["errors"] += 1
+            else:
+                # The newest successful run of a conversation counts
+                group["records"][record["case"]] = record
+
+    print(f"{'Preset':<20} {'Hash':<16} {'Model':<14} {'Conv':>5} {'Err':>4} {'p50 ms':>7} {'p95 ms':>7} {'TTFT ms':>8} {'In/turn':>8} {'Cached':>7} {'Out/turn':>8} {'Tokens':>8} {'Cost $':>8}")
+    for (preset, preset_hash, model), group in sorted(groups.items()):
+        turns = [turn for record in group["records"].values() for turn in record["turns"]]
+        latencies = [turn["latency"] for turn in turns if turn["latency"] is not None]
+        first_tokens = [turn["time_to_first_token"] for turn in turns if turn["time_to_first_token"] is not None]
+        input_tokens = sum(turn["input_tokens"] for turn in turns)
+        output_tokens = sum(turn["output_tokens"] for turn in turns)
+        cached_tokens = sum(turn["cached_tokens"] for turn in turns)
+        # Batch turns and older records carry no cost
+        cost = sum(turn.get("cost") or 0 for turn in turns)
+        per_turn = max(len(turns), 1)
+        print(
+            f"{preset[:20]:<20} {preset_hash:<16} {model[:14]:<14} {len(group['records']):>5} {group['errors']:>4} "
+            f"{percentile(latencies, 0.5) * 1000:>7.0f} {percentile(latencies, 0.95) * 1000:>7.0f} "
+            f"{(statistics.median(first_tokens) if first_tokens else float('nan')) * 1000:>8.0f} "
+            f"{input_tokens / per_turn:>8.0f} {cached_tokens / per_turn:>7.0f} {output_tokens / per_turn:>8.0f} "
+            f"{input_tokens + output_tokens:>8} {cost:>8.4f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=EVAL_CONFIG["corpus_path"])
+    parser.add_argument("--output", default=EVAL_CONFIG["output_path"])
+    parser.add_argument("--preset", action="append", help="Preset name or .txt path (repeatable; default: all presets)")
+    parser.add_argument("--model", action="append", help="Model from AVAILABLE_MODELS (repeatable)")
+    parser.add_argument("--temperature", type=float, default=DEFAULT_MODEL_SETTINGS["temperature"])
+    parser.add_argument("--workers", type=int, default=EVAL_CONFIG["workers"])
+    parser.add_argument("--batch", action="store_true", help="Use the OpenAI Batch API instead of live requests")
+    parser.add_argument("--report-only", action="store_true", help="Only print the report for an existing output file")
+    args = parser.parse_args()
+
+    if not args.report_only:
+        load_dotenv()
+        os.environ.setdefault("PYDANTIC_AI_NO_BANNER", "1")
+        logging.getLogger("drfreud.metrics").setLevel(logging.WARNING)
+        logging.getLogger("streamlit").setLevel(logging.ERROR)
+        # Worker threads have no Streamlit script context; that is expected
+        logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+        # Keep eval spend and prompt generations out of the store the
+        # chat replicas share, so evals never use up the users' budgets
+        SHARED_STATE_CONFIG["backend"] = "memory"
+
+        models = args.model or [DEFAULT_MODEL_SETTINGS["model_name"]]
+        for model_name in models:
+            if model_name not in AVAILABLE_MODELS:
+                sys.exit(f"Unknown model: {model_name} (choose from {', '.join(AVAILABLE_MODELS)})")
+
+        jobs = make_jobs(resolve_presets(args.preset), models, load_corpus(args.corpus), args.temperature)
+        finished = load_finished(args.output)
+        todo = [job for job in jobs if job["key"] not in finished]
+        print(f"{len(jobs)} conversations, {len(jobs) - len(todo)} already finished", file=sys.stderr)
+
+        writer = ResultWriter(args.output)
+        try:
+            if args.batch:
+                run_batch(todo, args.temperature, writer, f"{args.output}.batch.json")
+            else:
+                run_online(todo, args.temperature, args.workers, writer)
+        finally:
+            writer.close()
+
+    if Path(args.output).exists():
+        report(args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Token and cost accounting for Dr. Freud AI Chatbot.
+Counts the tokens of the context before a turn is sent, records the usage
+the API reports afterwards, prices it with ACCOUNTING_CONFIG["prices"] and
+enforces per-session and global budgets: close to a budget turns are
+degraded to a cheaper model with a shorter history, once it is used up they
+are refused. Spend counters live in the shared store, so all replicas
+count against the same budgets.
+"""
+
+import threading
+import time
+from .config import ACCOUNTING_CONFIG, DEFAULT_MODEL_SETTINGS
+from .shared_state import get_shared_store
+
+NAMESPACE = "spend"
+
+# Scope all chat turns count against; other scopes (e.g. evals) are only
+# counted, never limited
+GLOBAL = "global"
+
+# Budget states of a turn, from best to worst
+OK = "ok"
+DEGRADED = "degraded"
+EXHAUSTED = "exhausted"
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+_tiktoken_failed = False
+_LOADING = object()
+
+def _get_encoding(model_name):
+    """Get the tiktoken encoding for a model, or None to estimate.
+
+    The first use may download the encoding files, so it is loaded once in
+    the background; tokens are estimated until it is ready.
+    """
+    if ACCOUNTING_CONFIG["tokenizer"] != "tiktoken" or _tiktoken_failed:
+        return None
+    with _encodings_lock:
+        encoding = _encodings.get(model_name)
+        if encoding is None:
+            _encodings[model_name] = _LOADING
+            threading.Thread(target=_load_encoding, args=(model_name,), name="tiktoken-load", daemon=True).start()
+    return None if encoding is None or encoding is _LOADING else encoding
+
+def _load_encoding(model_name):
+    global _tiktoken_failed
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding(ACCOUNTING_CONFIG["default_encoding"])
+    except Exception as e:
+        # Not installed, or the encoding files cannot be downloaded
+        print(f"[DEBUG] tiktoken unavailable, estimating tokens: {str(e)}")
+        _tiktoken_failed = True
+        return
+    with _encodings_lock:
+        _encodings[model_name] = encoding
+
+def count_tokens(text, model_name=None):
+    """Count the tokens of a text (estimated if tiktoken is unavailable)."""
+    encoding = _get_encoding(model_name or DEFAULT_MODEL_SETTINGS["model_name"])
+    if encoding is None:
+        # About 4 characters per token
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages, model_name=None):
+    """Count the tokens of pydantic_ai messages: their text parts plus per-message overhead."""
+    total = 0
+    for message in messages or []:
+        total += ACCOUNTING_CONFIG["message_overhead"]
+        for part in message.parts:
+            content = getattr(part, "content", None)
+            if isinstance(content, str):
+                total += count_tokens(content, model_name)
+    return total
+
+def count_context_tokens(model_name, base_prompt, user_prompt, message_history):
+    """Count the input tokens of a turn before it is sent."""
+    return (
+        count_tokens(base_prompt, model_name)
+        + count_message_tokens(message_history, model_name)
+        + count_tokens(user_prompt, model_name)
+        + ACCOUNTING_CONFIG["message_overhead"]
+    )
+
+def get_cost(model_name, usage):
+    """Get the cost in USD of a turn's usage (input, cached and output tokens)."""
+    prices = ACCOUNTING_CONFIG["prices"].get(model_name)
+    if prices is None:
+        print(f"[DEBUG] No price for {model_name}, counted as free")
+        return 0.0
+    cached_tokens = usage.get("cached_tokens", 0)
+    uncached_tokens = max(0, usage["input_tokens"] - cached_tokens)
+    return (
+        uncached_tokens * prices["input"]
+        + cached_tokens * prices["cached_input"]
+        + usage["output_tokens"] * prices["output"]
+    ) / 1_000_000
+
+def _get_scopes(session_key, scope=GLOBAL):
+    """Get (scope, counter key, budget) for every budget a session counts against."""
+    period = int(time.time() // ACCOUNTING_CONFIG["period"])
+    budget = ACCOUNTING_CONFIG["global_budget"] if scope == GLOBAL else {}
+    scopes = [(scope, f"{scope}:{period}", budget)]
+    if session_key:
+        scopes.append(("session", f"session:{session_key}:{period}", ACCOUNTING_CONFIG["session_budget"]))
+    return scopes
+
+def get_spend(session_key=None, scope=GLOBAL):
+    """Get the tokens and cost spent this period, by scope (scope and, with a key, "session")."""
+    store = get_shared_store()
+    return {
+        scope: {
+            metric: store.get(NAMESPACE, f"{key}:{metric}") or 0
+            for metric in ("tokens", "cost")
+        }
+        for scope, key, _ in _get_scopes(session_key, scope)
+    }
+
+def record_usage(session_key, model_name, usage, scope=GLOBAL):
+    """Add a turn's usage to its budgets; returns its cost in USD.
+
+    Without a session key (e.g. summaries) it only counts against scope.
+    """
+    cost = get_cost(model_name, usage)
+    tokens = usage["input_tokens"] + usage["output_tokens"]
+    if tokens:
+        store = get_shared_store()
+        # Counters outlive their period a little, then expire
+        ttl = 2 * ACCOUNTING_CONFIG["period"]
+        for _, key, _ in _get_scopes(session_key, scope):
+            store.incr(NAMESPACE, f"{key}:tokens", tokens, ttl)
+            store.incr(NAMESPACE, f"{key}:cost", cost, ttl)
+    return cost
+
+def check_budget(session_key, model_name, context_tokens):
+    """Get the budget state for a turn of context_tokens input tokens.
+
+    A turn is degraded if it could take a budget past degrade_at (assuming
+    the full max_tokens output), and refused once a budget is used up.
+    """
+    max_output = DEFAULT_MODEL_SETTINGS["max_tokens"]
+    estimate = {
+        "tokens": context_tokens + max_output,
+        "cost": get_cost(model_name, {"input_tokens": context_tokens, "output_tokens": max_output})
+    }
+    spend = get_spend(session_key)
+    state = OK
+    for scope, _, budget in _get_scopes(session_key):
+        for metric, limit in budget.items():
+            if limit is None:
+                continue
+            spent = spend[scope][metric]
+            if spent >= limit:
+                print(f"[DEBUG] {scope.capitalize()} {metric} budget used up: {spent:g} of {limit:g}")
+                return EXHAUSTED
+            if spent + estimate[metric] >= ACCOUNTING_CONFIG["degrade_at"] * limit:
+                state = DEGRADED
+    if state == DEGRADED:
+        print("[DEBUG] Budget nearly used up, degrading the turn")
+    return state
@@ -3,111 +3,370 @@ Agent management for Dr. Freud AI Chatbot.
 Handles Pydantic AI agent creation and caching.
 """
 
+import hashlib
 import streamlit as st
 from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, UserPromptPart, TextPart
 from pydantic_ai.models.openai import OpenAIResponsesModel, OpenAIResponsesModelSettings
 from openai.types.responses import WebSearchToolParam
-from .config import DEFAULT_MODEL_SETTINGS, CACHE_CONFIG, TEXT_CONTENT
+from .config import DEFAULT_MODEL_SETTINGS, ACCOUNTING_CONFIG, CACHE_CONFIG, ROUTING_CONFIG, TEXT_CONTENT
+from . import accounting, coalescing, metrics, resilience, response_cache, router
+from .http_client import get_provider
+from .shared_state import get_shared_store
 
-# Global cache for agent - will be cleared when needed
-_agent_cache = {}
+def get_prompt_hash(prompt):
+    """Get a stable short hash identifying a system prompt."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
 
-# Cache only the base agent (without conversation history)
+def get_prompt_generation(prompt_hash):
+    """Get the invalidation generation of a prompt, shared by all replicas."""
+    return get_shared_store().get("prompt_generations", prompt_hash) or 0
+
+def invalidate_prompt(prompt_hash):
+    """Rebuild the agents and drop the cached responses of one prompt, on every replica."""
+    get_shared_store().incr("prompt_generations", prompt_hash)
+
+# Agent pool: one agent per (model, temperature, web search, prompt hash,
+# generation). The prompt text is passed as an underscore argument so
+# Streamlit keys the cache on the hash only instead of re-hashing the full
+# prompt every turn. Bumping a prompt's generation makes every replica build
+# fresh agents for that prompt alone.
 @st.cache_resource(ttl=CACHE_CONFIG["agent_ttl"], show_spinner=TEXT_CONTENT["agent_init_message"])
-def _get_base_agent(model_name, temperature, enable_web_search):
-    """Create and cache base agent without conversation history."""
+def _get_agent(model_name, temperature, enable_web_search, prompt_hash, generation, _base_prompt):
+    """Create and cache an agent with the system prompt baked in."""
     try:
-        # Initialize model with settings
-        model = OpenAIResponsesModel(model_name)
-        model_settings = OpenAIResponsesModelSettings(
-            temperature=temperature,
-            max_tokens=DEFAULT_MODEL_SETTINGS["max_tokens"]
-        )
-        
-        # Initialize base agent without system prompt
-        agent = Agent(
-            model=model,
-            model_settings=model_settings,
-            system_prompt="You are a helpful assistant."  # Temporary prompt
-        )
-        
-        # Add web search if enabled
+        settings = {
+            "temperature": temperature,
+            "max_tokens": DEFAULT_MODEL_SETTINGS["max_tokens"],
+            # Route requests sharing this persona to the same provider-side
+            # prompt cache
+            "extra_body": {"prompt_cache_key": f"drfreud-{prompt_hash}"}
+        }
+
+        # Web search is part of this agent's own settings so pooled agents
+        # never mutate each other
         if enable_web_search:
-            agent.model.model_settings.openai_builtin_tools = [
+            settings["openai_builtin_tools"] = [
                 WebSearchToolParam(type='web_search_preview')
             ]
-        
-        return agent
+
+        # All models share one pooled client and its keep-alive connections
+        model = OpenAIResponsesModel(model_name, provider=get_provider())
+
+        # Instructions are re-sent on every run, even with a message history.
+        # They must stay byte-identical between turns: the persona is the
+        # cacheable prefix, and everything variable (summary, turns) follows
+        # it in the message history.
+        return Agent(
+            model=model,
+            model_settings=OpenAIResponsesModelSettings(**settings),
+            instructions=_base_prompt
+        )
     except Exception as e:
-        st.error(f"Error initializing base agent: {str(e)}")
+        st.error(f"Error initializing agent: {str(e)}")
         return None
 
-def get_agent_with_context(model_name, temperature, enable_web_search, base_prompt, conversation_history=""):
-    """Get agent and run with conversation context."""
-    # Get cached base agent
-    base_agent = _get_base_agent(model_name, temperature, enable_web_search)
-    
-    if base_agent is None:
+def get_agent(model_name, temperature, enable_web_search, base_prompt):
+    """Get the pooled agent for the given settings and system prompt."""
+    prompt_hash = get_prompt_hash(base_prompt)
+    return _get_agent(model_name, temperature, enable_web_search, prompt_hash, get_prompt_generation(prompt_hash), base_prompt)
+
+def require_agent(model_name, temperature, enable_web_search, base_prompt):
+    """Get the pooled agent, raising if it could not be created."""
+    agent = get_agent(model_name, temperature, enable_web_search, base_prompt)
+    if agent is None:
+        raise RuntimeError(f"Agent for {model_name} unavailable")
+    return agent
+
+def to_model_message(role, content):
+    """Convert a single chat message into a pydantic_ai model message."""
+    if role == "user":
+        return ModelRequest(parts=[UserPromptPart(content=content)])
+    return ModelResponse(parts=[TextPart(content=content)])
+
+def summary_message(summary):
+    """Wrap a running conversation summary as a model message."""
+    return ModelRequest(parts=[SystemPromptPart(content=f"Zusammenfassung des bisherigen Gesprächs:\n{summary}")])
+
+def build_message_history(messages):
+    """Convert chat messages ({"role", "content"} dicts) into model messages."""
+    return [to_model_message(msg["role"], msg["content"]) for msg in messages]
+
+def get_usage_stats(usage):
+    """Extract input, output and cached token counts from a run's usage.
+
+    Accepts either the usage object or the run result's usage() method.
+    """
+    if callable(usage):
+        usage = usage()
+    details = getattr(usage, "details", None) or {}
+    cached_tokens = getattr(usage, "cache_read_tokens", None)
+    if cached_tokens is None:
+        cached_tokens = details.get("cached_tokens", 0)
+    return {
+        "input_tokens": getattr(usage, "input_tokens", None) or getattr(usage, "request_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", None) or getattr(usage, "response_tokens", 0) or 0,
+        "cached_tokens": cached_tokens or 0,
+        "response_cache_hit": False,
+        "coalesced": False
+    }
+
+# Usage reported for turns answered from the response cache
+CACHE_HIT_USAGE = {
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cached_tokens": 0,
+    "response_cache_hit": True,
+    "coalesced": False,
+    "cost": 0.0
+}
+
+# Usage reported for turns that shared another session's identical request
+COALESCED_USAGE = dict(CACHE_HIT_USAGE, response_cache_hit=False, coalesced=True)
+
+# Usage reported for turns refused because a budget is used up
+REFUSED_USAGE = dict(CACHE_HIT_USAGE, response_cache_hit=False)
+
+# Usage reported for failed turns (plus an "error" message); whatever a
+# failed request used is not known
+FAILED_USAGE = dict(CACHE_HIT_USAGE, response_cache_hit=False)
+
+def _get_cache_key(model_name, temperature, base_prompt, user_prompt, message_history):
+    """Get the response cache key for a turn, or None if it must not be cached."""
+    if not response_cache.is_cacheable(temperature, message_history):
+        return None
+    prompt_hash = get_prompt_hash(base_prompt)
+    prompt_key = f"{prompt_hash}:{get_prompt_generation(prompt_hash)}"
+    return response_cache.make_key(prompt_key, model_name, temperature, message_history, user_prompt)
+
+def _get_flight_key(model_name, temperature, enable_web_search, base_prompt, user_prompt, message_history):
+    """Get the single-flight key for a turn, or None if it should not be coalesced."""
+    if len(message_history or []) > coalescing.COALESCING_CONFIG["max_history_messages"]:
         return None
-    
-    # Create full context for this specific request
-    if conversation_history.strip():
-        full_context = f"{base_prompt}\n\nPrevious conversation:\n{conversation_history}"
-    else:
-        full_context = base_prompt
-    
-    print(f"[DEBUG] Agent context hash: {hash(full_context)}")
-    print(f"[DEBUG] Context ends with: ...{full_context[-100:]}")
-    
-    return base_agent, full_context
+    prompt_hash = get_prompt_hash(base_prompt)
+    prompt_key = f"{prompt_hash}:{get_prompt_generation(prompt_hash)}:{enable_web_search}"
+    return response_cache.make_key(prompt_key, model_name, temperature, message_history, user_prompt)
+
+def _resolve_model(model_name, enable_web_search, user_prompt, message_history):
+    """Get the model for a turn, routing "auto" (see router.py). Returns (model, routed)."""
+    if router.is_auto(model_name):
+        return router.route(user_prompt, message_history, enable_web_search), True
+    return model_name, False
+
+def _shorten_history(message_history, keep):
+    """Keep the running summary, if any, and the last `keep` messages."""
+    message_history = message_history or []
+    head = message_history[:1]
+    if not (head and isinstance(head[0], ModelRequest) and all(isinstance(part, SystemPromptPart) for part in head[0].parts)):
+        head = []
+    # Whole turns only, so the kept history starts with a user message
+    keep -= keep % 2
+    return head + (message_history[len(head):][-keep:] if keep else [])
+
+def _get_degraded_model(enable_web_search):
+    """Get the cheaper model for degraded turns; it must support web search if that is on."""
+    model_name = ACCOUNTING_CONFIG["degraded_model"]
+    if enable_web_search and model_name not in ROUTING_CONFIG["web_search_models"]:
+        return ACCOUNTING_CONFIG["degraded_web_search_model"]
+    return model_name
+
+def _apply_budget(budget_key, model_name, enable_web_search, base_prompt, user_prompt, message_history):
+    """Check the turn against its budgets (see accounting.py), degrading it if needed.
+
+    Returns (budget state, model, message history, context tokens).
+    """
+    context_tokens = accounting.count_context_tokens(model_name, base_prompt, user_prompt, message_history)
+    state = accounting.check_budget(budget_key, model_name, context_tokens)
+    if state == accounting.DEGRADED:
+        model_name = _get_degraded_model(enable_web_search)
+        message_history = _shorten_history(message_history, ACCOUNTING_CONFIG["degraded_history_messages"])
+        context_tokens = accounting.count_context_tokens(model_name, base_prompt, user_prompt, message_history)
+    return state, model_name, message_history, context_tokens
+
+def _start_turn(model_name, enable_web_search, base_prompt, user_prompt, message_history, budget_key):
+    """Route and budget a turn and start its metrics record.
+
+    Returns (turn, model, message history); the record is tagged by model
+    and preset (prompt hash).
+    """
+    model_name, routed = _resolve_model(model_name, enable_web_search, user_prompt, message_history)
+    budget, model_name, message_history, context_tokens = _apply_budget(
+        budget_key, model_name, enable_web_search, base_prompt, user_prompt, message_history
+    )
+    turn = metrics.new_turn(
+        model_name,
+        get_prompt_hash(base_prompt),
+        len(base_prompt) + len(user_prompt),
+        len(message_history or [])
+    )
+    turn.update(routed=routed, budget=budget, context_tokens=context_tokens)
+    return turn, model_name, message_history
+
+def _record_usage(turn, budget_key, usage):
+    """Add a turn's usage to the turn record and its budgets; returns it with the cost."""
+    usage = dict(usage, cost=accounting.record_usage(budget_key, turn["fallback_model"] or turn["model"], usage))
+    turn.update(usage)
+    return usage
+
+def _report_usage(turn, usage):
+    """Get the usage passed to on_usage: tokens, cost, the answering model and budget state."""
+    return dict(usage, model=turn["fallback_model"] or turn["model"], budget=turn["budget"])
 
 def clear_agent_cache():
-    """Clear the agent cache to force recreation."""
-    _get_base_agent.clear()
+    """Clear this process's whole agent pool (prefer invalidate_prompt)."""
+    _get_agent.clear()
+
+def get_agent_response_with_context(model_name, temperature, enable_web_search, base_prompt, user_prompt, message_history=None, budget_key=None):
+    """Get response from agent with conversation context.
 
-def get_agent_response_with_context(model_name, temperature, enable_web_search, base_prompt, user_prompt, conversation_history=""):
-    """Get response from agent with conversation context."""
+    model_name may be "auto" to route the turn to a model (see router.py).
+    budget_key identifies the session whose budget the turn counts against
+    (see accounting.py); without one only the global budget applies.
+    """
+    turn, model_name, message_history = _start_turn(
+        model_name, enable_web_search, base_prompt, user_prompt, message_history, budget_key
+    )
     try:
-        # Get agent and context
-        agent, full_context = get_agent_with_context(model_name, temperature, enable_web_search, base_prompt, conversation_history)
-        
-        if agent is None:
-            return "Entschuldigung, ich kann im Moment nicht antworten."
-        
-        # Create a new agent instance with the full context as system prompt
-        # This ensures the conversation history is properly included
-        agent_with_context = Agent(
-            model=agent.model,
-            model_settings=agent.model_settings,
-            system_prompt=full_context
-        )
-        
-        # Add web search if enabled
-        if enable_web_search:
-            agent_with_context.model.model_settings.openai_builtin_tools = [
-                WebSearchToolParam(type='web_search_preview')
-            ]
-        
+        if turn["budget"] == accounting.EXHAUSTED:
+            return TEXT_CONTENT["budget_exhausted"]
+
+        # Web search answers depend on the live web and are never cached
+        cache_key = None if enable_web_search else _get_cache_key(model_name, temperature, base_prompt, user_prompt, message_history)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"[DEBUG] Response cache hit: '{user_prompt}'")
+                turn.update(CACHE_HIT_USAGE)
+                return cached
+
+        def make_call(candidate):
+            agent = require_agent(candidate, temperature, enable_web_search, base_prompt)
+            return lambda: agent.run(user_prompt, message_history=message_history or None)
+
         print(f"[DEBUG] Sending prompt to agent: '{user_prompt}'")
-        response = agent_with_context.run_sync(user_prompt)
-        
+        # Retries, deadlines and fallback models (see resilience.py)
+        response = resilience.run(model_name, make_call, timings=turn)
+        _record_usage(turn, budget_key, get_usage_stats(response.usage))
+
         # Handle different response formats
         if hasattr(response, 'output'):
-            return response.output
+            output = response.output
         elif hasattr(response, 'content'):
-            return response.content
+            output = response.content
         else:
-            return str(response)
+            output = str(response)
+
+        # Answers of a fallback model are not cached for the requested one
+        if cache_key is not None and not turn["fallback_model"]:
+            response_cache.put(cache_key, output)
+        return output
     except Exception as e:
+        turn["error"] = str(e)
         st.error(f"Error getting agent response: {str(e)}")
         return "Entschuldigung, ich kann im Moment nicht antworten."
+    finally:
+        # Without streaming, the first token arrives with the full response
+        turn["total_latency"] = turn["time_to_first_token"] = metrics.elapsed(turn)
+        metrics.record_turn(turn)
+
+def stream_agent_response_with_context(model_name, temperature, enable_web_search, base_prompt, user_prompt, message_history=None, on_usage=None, budget_key=None):
+    """Stream the agent response as text chunks while they arrive.
+
+    model_name may be "auto" to route the turn to a model (see router.py).
+    on_usage, if given, is called with the turn's token usage, its cost, the
+    model that answered and the budget state once the stream has finished.
+    If the turn failed or was refused (budget "exhausted"), the usage has an
+    "error" and the reply streamed so far is incomplete; on_usage is then
+    called before the apology or refusal is streamed.
+    budget_key identifies the session whose budget the turn counts against
+    (see accounting.py); without one only the global budget applies.
+    """
+    turn, model_name, message_history = _start_turn(
+        model_name, enable_web_search, base_prompt, user_prompt, message_history, budget_key
+    )
+    try:
+        if turn["budget"] == accounting.EXHAUSTED:
+            # A refusal is not a reply; like a failure, it is reported first
+            if on_usage is not None:
+                on_usage(_report_usage(turn, dict(REFUSED_USAGE, error="Budget used up")))
+            yield TEXT_CONTENT["budget_exhausted"]
+            return
+
+        # Web search answers depend on the live web and are never cached
+        cache_key = None if enable_web_search else _get_cache_key(model_name, temperature, base_prompt, user_prompt, message_history)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"[DEBUG] Response cache hit: '{user_prompt}'")
+                turn.update(CACHE_HIT_USAGE)
+                turn["time_to_first_token"] = metrics.elapsed(turn)
+                yield cached
+                if on_usage is not None:
+                    on_usage(_report_usage(turn, CACHE_HIT_USAGE))
+                return
+
+        print(f"[DEBUG] Streaming prompt to agent: '{user_prompt}'")
+        run_usage = []
+
+        def make_stream(candidate):
+            agent = require_agent(candidate, temperature, enable_web_search, base_prompt)
+
+            async def agen():
+                async with agent.run_stream(user_prompt, message_history=message_history or None) as response:
+                    async for chunk in response.stream_text(delta=True):
+                        yield chunk
+                    run_usage.append(response.usage)
+            return agen
+
+        def bill_drained():
+            # This turn stopped reading, but its request went on for the
+            # sessions that joined it; its spend still counts against ours
+            if run_usage:
+                usage = _record_usage(turn, budget_key, get_usage_stats(run_usage[-1]))
+                print(f"[DEBUG] Usage of handed-over request: {usage['input_tokens']} in, {usage['output_tokens']} out, ${usage['cost']:.5f}")
+
+        # Identical requests in flight from other sessions share one call;
+        # retries, deadlines and fallback models apply to that call
+        flight_key = _get_flight_key(model_name, temperature, enable_web_search, base_prompt, user_prompt, message_history)
+        stream = coalescing.single_flight(
+            flight_key,
+            lambda: resilience.stream(model_name, make_stream, timings=turn),
+            on_drained=bill_drained
+        )
+
+        chunks = []
+        for chunk in stream:
+            if not chunks:
+                turn["time_to_first_token"] = metrics.elapsed(turn)
+            chunks.append(chunk)
+            yield chunk
+
+        # Answers of a fallback model are not cached for the requested one
+        if cache_key is not None and not turn["fallback_model"]:
+            response_cache.put(cache_key, "".join(chunks))
+
+        # Usage is reported from this thread, not the engine loop, so the
+        # callback may safely touch session state
+        usage = _record_usage(turn, budget_key, get_usage_stats(run_usage[-1]) if run_usage else COALESCED_USAGE)
+        print(f"[DEBUG] Usage: {usage['input_tokens']} in ({usage['cached_tokens']} cached), {usage['output_tokens']} out, ${usage['cost']:.5f}")
+        if on_usage is not None:
+            on_usage(_report_usage(turn, usage))
+    except Exception as e:
+        turn["error"] = str(e)
+        st.error(f"Error getting agent response: {str(e)}")
+        if on_usage is not None:
+            on_usage(_report_usage(turn, dict(FAILED_USAGE, error=str(e))))
+        yield "Entschuldigung, ich kann im Moment nicht antworten."
+    finally:
+        turn["total_latency"] = metrics.elapsed(turn)
+        metrics.record_turn(turn)
 
 # Legacy function for backward compatibility
 def get_agent_response(agent, prompt):
     """Legacy function for backward compatibility."""
     try:
         response = agent.run_sync(prompt)
-        
+
         # Handle different response formats
         if hasattr(response, 'output'):
             return response.output
@@ -117,4 +376,4 @@ def get_agent_response(agent, prompt):
             return str(response)
     except Exception as e:
         st.error(f"Error getting agent response: {str(e)}")
-        return "Entschuldigung, ich kann im Moment nicht antworten."
\ No newline at end of file
+        return "Entschuldigung, ich kann im Moment nicht antworten."
@@ -0,0 +1,199 @@
+"""
+Static assets for Dr. Freud AI Chatbot.
+Builds resized WebP (and AVIF, where Pillow supports it) variants of the
+images in UI_CONFIG["header_images"] at their displayed size, with
+content-hashed file names, into ASSET_CONFIG["static_dir"]. Streamlit serves
+that folder under app/static/; since a changed image gets a new name, the
+files can be cached by browsers for good.
+
+Build (the Docker image does this; the app also rebuilds stale variants
+on startup):
+    python -m src.assets
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from .config import ASSET_CONFIG, UI_CONFIG
+
+MANIFEST_NAME = "manifest.json"
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _write_atomic(path, data):
+    """Write a file via a temporary file, so readers never see it half-written."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _get_widths(name):
+    width = UI_CONFIG["image_width"]
+    return ASSET_CONFIG["widths"].get(name, [width, width * 2])
+
+def _get_formats():
+    from PIL import features
+    return ["avif", "webp"] if features.check("avif") else ["webp"]
+
+def find_missing_sources():
+    """Get the UI_CONFIG["header_images"] entries whose source file does not exist."""
+    return {
+        name: source
+        for name, source in UI_CONFIG["header_images"].items()
+        if not Path(source).is_file()
+    }
+
+def _load_manifest():
+    path = Path(ASSET_CONFIG["static_dir"]) / MANIFEST_NAME
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _is_stale(manifest):
+    """Check whether any source, width or output file differs from the manifest."""
+    if manifest is None:
+        return True
+    static_dir = Path(ASSET_CONFIG["static_dir"])
+    for name, source in UI_CONFIG["header_images"].items():
+        path = Path(source)
+        entry = manifest.get(name)
+        if not path.is_file():
+            if entry is not None:
+                return True
+            continue
+        if entry is None or entry["source"] != source or entry["widths"] != _get_widths(name):
+            return True
+        if entry["hash"] != _hash_bytes(path.read_bytes()):
+            return True
+        for variants in entry["variants"].values():
+            if not all((static_dir / filename).is_file() for filename in variants.values()):
+                return True
+    return False
+
+def build_assets():
+    """Build the variants of every existing source image and write the manifest."""
+    from PIL import Image
+
+    static_dir = Path(ASSET_CONFIG["static_dir"])
+    static_dir.mkdir(parents=True, exist_ok=True)
+    formats = _get_formats()
+    previous = _load_manifest() or {}
+    manifest = {}
+
+    for name, source in UI_CONFIG["header_images"].items():
+        path = Path(source)
+        if not path.is_file():
+            print(f"[DEBUG] Asset missing, skipped: {source}")
+            continue
+        data = path.read_bytes()
+        entry = {"source": source, "hash": _hash_bytes(data), "widths": _get_widths(name), "variants": {}}
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            for image_format in formats:
+                variants = entry["variants"][image_format] = {}
+                for width in entry["widths"]:
+                    # Never upscale; a 2x variant of a small source is the source size
+                    width = min(width, image.width)
+                    height = round(image.height * width / image.width)
+                    output = io.BytesIO()
+                    image.resize((width, height), Image.LANCZOS).save(
+                        output, format=image_format.upper(), quality=ASSET_CONFIG["quality"][image_format]
+                    )
+                    encoded = output.getvalue()
+                    filename = f"{path.stem}.{width}w.{_hash_bytes(encoded)[:12]}.{image_format}"
+                    if not (static_dir / filename).exists():
+                        _write_atomic(static_dir / filename, encoded)
+                    variants[str(width)] = filename
+        manifest[name] = entry
+
+    _write_atomic(static_dir / MANIFEST_NAME, json.dumps(manifest, indent=2).encode("utf-8"))
+
+    # Variants of older builds are no longer referenced
+    current = {filename for entry in manifest.values() for variants in entry["variants"].values() for filename in variants.values()}
+    for entry in previous.values():
+        for variants in entry.get("variants", {}).values():
+            for filename in variants.values():
+                if filename not in current:
+                    (static_dir / filename).unlink(missing_ok=True)
+    return manifest
+
+def ensure_assets():
+    """Verify the source images and rebuild stale variants, once per process.
+
+    Missing sources are reported and left out, so the page renders without
+    them instead of requesting files that do not exist.
+    """
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            for name, source in find_missing_sources().items():
+                print(f"[DEBUG] UI_CONFIG['header_images']['{name}'] not found: {source}")
+            manifest = _load_manifest()
+            if _is_stale(manifest):
+                try:
+                    manifest = build_assets()
+                except Exception as e:
+                    # e.g. a read-only static dir; fall back to the originals
+                    print(f"[DEBUG] Asset build failed: {str(e)}")
+                    manifest = {}
+            _manifest = manifest
+    return _manifest
+
+def _url(filename):
+    return f"{ASSET_CONFIG['url_prefix']}/{filename}"
+
+def get_image_html(name, alt=""):
+    """Get a <picture> tag for a built image at UI_CONFIG["image_width"], or None if not built."""
+    entry = ensure_assets().get(name)
+    if entry is None:
+        return None
+    display_width = UI_CONFIG["image_width"]
+    sources = []
+    for image_format, variants in entry["variants"].items():
+        srcset = ", ".join(f"{_url(filename)} {int(width) / display_width:g}x" for width, filename in variants.items())
+        sources.append(f'<source type="image/{image_format}" srcset="{srcset}">')
+    fallback = _url(next(iter(entry["variants"]["webp"].values())))
+    return (
+        f'<picture class="drfreud-header-image">{"".join(sources)}'
+        f'<img src="{fallback}" width="{display_width}" alt="{alt}" loading="eager" decoding="async"></picture>'
+    )
+
+def get_background_css(name="background"):
+    """Get the CSS background-image declarations for a built image, or "" if not built."""
+    entry = ensure_assets().get(name)
+    if entry is None:
+        return ""
+    webp = entry["variants"]["webp"]
+    largest = max(webp, key=int)
+    candidates = ", ".join(
+        f'url("{_url(variants[largest])}") type("image/{image_format}")'
+        for image_format, variants in entry["variants"].items()
+    )
+    return f'background-image: url("{_url(webp[largest])}"); background-image: image-set({candidates});'
+
+if __name__ == "__main__":
+    missing = find_missing_sources()
+    built = build_assets()
+    for name, entry in built.items():
+        files = [filename for variants in entry["variants"].values() for filename in variants.values()]
+        print(f"{name}: {', '.join(files)}")
+    for name, source in missing.items():
+        print(f"Missing {name}: {source}")
+    sys.exit(1 if missing and "--strict" in sys.argv else 0)
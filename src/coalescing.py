@@ -0,0 +1,194 @@
+"""
+Request coalescing for Dr. Freud AI Chatbot.
+Identical in-flight requests share one upstream call (single flight), and
+turns of the same session run one at a time, with a newer turn cancelling
+or queueing behind the one it supersedes.
+"""
+
+import threading
+from contextlib import contextmanager
+from .config import COALESCING_CONFIG
+
+class TurnBusyError(RuntimeError):
+    """Raised when a session's previous turn does not finish in time."""
+
+class _Flight:
+    """Chunks of one in-flight upstream request, replayed to every follower."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.condition = threading.Condition()
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def single_flight(key, stream_factory, on_drained=None):
+    """Join an identical in-flight request or start one, yielding its chunks.
+
+    The first caller (the leader) streams from stream_factory(); followers
+    replay the leader's chunks as they arrive. If the leader stops reading
+    (its session reran or closed), the request carries on in the background
+    while followers remain; on_drained, if given, is then called from the
+    background thread once that request has finished, so its usage can still
+    be billed to the leader. A key of None always starts a new request.
+    """
+    if key is None or not COALESCING_CONFIG["enabled"]:
+        yield from stream_factory()
+        return
+    # Decided on the first chunk, so a stream that is never read never
+    # leaves an orphaned flight behind
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights[key] = _Flight()
+        else:
+            flight.followers += 1
+    if is_leader:
+        yield from _lead(key, flight, stream_factory, on_drained)
+    else:
+        yield from _follow(flight)
+
+def _publish(flight, chunk):
+    with flight.condition:
+        flight.chunks.append(chunk)
+        flight.condition.notify_all()
+
+def _finish(key, flight, error=None):
+    with _flights_lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+    with flight.condition:
+        flight.error = error
+        flight.done = True
+        flight.condition.notify_all()
+
+def _lead(key, flight, stream_factory, on_drained):
+    upstream = iter(stream_factory())
+    try:
+        for chunk in upstream:
+            _publish(flight, chunk)
+            yield chunk
+    except GeneratorExit:
+        # The leader's session reran, was superseded or closed; the request
+        # itself did not fail, so followers get the rest of the reply
+        with _flights_lock:
+            hand_over = flight.followers > 0
+        if hand_over:
+            threading.Thread(target=_drain, args=(key, flight, upstream, on_drained), name="coalesced-request", daemon=True).start()
+            return
+        _finish(key, flight)
+        # Closing the stream cancels its engine request
+        upstream.close()
+        raise
+    except BaseException as e:
+        _finish(key, flight, f"{type(e).__name__}: {e}")
+        raise
+    _finish(key, flight)
+
+def _drain(key, flight, upstream, on_drained):
+    """Read an abandoned leader's request to the end for its followers."""
+    print(f"[DEBUG] Coalesced request continues without its leader: {flight.followers} followers")
+    try:
+        for chunk in upstream:
+            _publish(flight, chunk)
+            with _flights_lock:
+                if flight.followers == 0:
+                    break
+    except Exception as e:
+        _finish(key, flight, f"{type(e).__name__}: {e}")
+        return
+    _finish(key, flight)
+    upstream.close()
+    if on_drained is not None:
+        on_drained()
+
+def _follow(flight):
+    position = 0
+    try:
+        while True:
+            with flight.condition:
+                while position >= len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                chunks = flight.chunks[position:]
+                done = flight.done
+            # Yield outside the lock so a slow follower never blocks the leader
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if done:
+                if flight.error is not None:
+                    raise RuntimeError(f"Coalesced request failed: {flight.error}")
+                return
+    finally:
+        with _flights_lock:
+            flight.followers -= 1
+
+class _TurnGate:
+    """Serializes the turns of one session."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latest = 0
+        self.users = 0
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+@contextmanager
+def session_turn(session_key):
+    """Run one turn of a session exclusively.
+
+    Yields a callable telling whether this turn is still the latest one.
+    With COALESCING_CONFIG["supersede"] == "cancel", a running turn should
+    stop as soon as it returns False; with "queue" it always returns True
+    and newer turns simply wait.
+    """
+    with _gates_lock:
+        gate = _gates.setdefault(session_key, _TurnGate())
+        gate.latest += 1
+        gate.users += 1
+        turn_id = gate.latest
+    try:
+        if not gate.lock.acquire(timeout=COALESCING_CONFIG["turn_timeout"]):
+            raise TurnBusyError("Previous turn of this session is still running")
+        try:
+            if COALESCING_CONFIG["supersede"] == "cancel":
+                yield lambda: gate.latest == turn_id
+            else:
+                yield lambda: True
+        finally:
+            gate.lock.release()
+    finally:
+        with _gates_lock:
+            gate.users -= 1
+            if gate.users == 0:
+                _gates.pop(session_key, None)
+
+def serialized_stream(session_key, chunks, on_superseded=None):
+    """Yield chunks as one exclusive turn of a session, stopping if superseded.
+
+    on_superseded, if given, is called when the turn stops early because a
+    newer one started, so its partial reply can be discarded.
+    """
+    with session_turn(session_key) as is_current:
+        iterator = iter(chunks)
+        try:
+            # Checked before every chunk, so a turn superseded while queued
+            # never starts its upstream request
+            while is_current():
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                yield chunk
+            print(f"[DEBUG] Turn superseded, stopping: {session_key}")
+            if on_superseded is not None:
+                on_superseded()
+        finally:
+            # Closing the stream cancels its engine request
+            if hasattr(iterator, "close"):
+                iterator.close()
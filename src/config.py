@@ -28,6 +28,186 @@ AVAILABLE_MODELS = [
     "gpt-3.5-turbo"
 ]
 
+# Model Routing Configuration (see src/router.py)
+ROUTING_CONFIG = {
+    # Offer "auto" in the model selector: each turn goes to the first model
+    # of the tiers that is capable enough and meets the latency target
+    "enabled": True,
+    "auto_model": "auto",
+    # Cheapest first; a turn's complexity decides the lowest tier it may use
+    "tiers": ["gpt-4.1-nano", "gpt-4o-mini", "gpt-4o"],
+    # Models that support the web search tool
+    "web_search_models": ["gpt-4o-mini", "gpt-4o"],
+    # Message length (characters) from which a turn counts as medium / complex
+    "medium_chars": 120,
+    "complex_chars": 600,
+    # History length (messages) from which a turn counts as medium / complex
+    "medium_history": 8,
+    "complex_history": 24,
+    # Target p95 time to first token, in seconds, from the last turns per model
+    "latency_slo": 2.0,
+    "min_samples": 5,
+    # "cheapest": lowest capable tier meeting the target;
+    # "fastest": capable model with the lowest p95
+    "objective": "cheapest"
+}
+
+# Context Window Configuration
+CONTEXT_CONFIG = {
+    # Token budget for the conversation history sent per turn, by model
+    "token_budgets": {
+        "gpt-4o-mini": 6000,
+        "gpt-4.1-nano": 4000,
+        "gpt-4o": 6000,
+        "gpt-4-turbo": 6000,
+        "gpt-3.5-turbo": 3000,
+        # History is built before routing, so it must fit every routed model
+        "auto": 4000
+    },
+    "default_token_budget": 4000,
+    # Most recent turns (user + assistant pairs) always kept verbatim
+    "recent_turns": 6,
+    # Model used to fold older turns into the running summary
+    "summary_model": "gpt-4.1-nano",
+    "summary_temperature": 0.0,
+    # Seconds to send the full history instead of retrying a failed summary
+    "summary_retry_after": 120
+}
+
+# Token and Cost Accounting Configuration (see src/accounting.py)
+ACCOUNTING_CONFIG = {
+    # "tiktoken" counts exactly when the package and its encoding files are
+    # available, else falls back to "estimate" (about 4 characters per token)
+    "tokenizer": "tiktoken",
+    "default_encoding": "o200k_base",
+    # Tokens the API adds per message for roles and separators
+    "message_overhead": 4,
+    # USD per million tokens: input, cached input, output
+    "prices": {
+        "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+        "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+        "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+        "gpt-4-turbo": {"input": 10.00, "cached_input": 10.00, "output": 30.00},
+        "gpt-3.5-turbo": {"input": 0.50, "cached_input": 0.50, "output": 1.50}
+    },
+    # Budgets per period (seconds); None means unlimited. The session budget
+    # applies per browser tab (UI) or per conversation (API), the global one
+    # to all sessions of all replicas together.
+    "period": 86400,
+    "session_budget": {"tokens": 300000, "cost": 0.25},
+    "global_budget": {"tokens": None, "cost": 20.0},
+    # From this share of a budget on, turns go to the degraded model with a
+    # shorter history; once a budget is used up, turns are refused
+    "degrade_at": 0.8,
+    "degraded_model": "gpt-4.1-nano",
+    # Used instead when web search is on and degraded_model cannot search
+    "degraded_web_search_model": "gpt-4o-mini",
+    "degraded_history_messages": 4
+}
+
+# Async Engine Configuration
+ENGINE_CONFIG = {
+    # Maximum number of requests in flight against the API
+    "max_concurrency": 32,
+    # Maximum number of accepted requests (running or waiting)
+    "max_queue": 256,
+    # Seconds a session waits for a queue slot before being rejected
+    "queue_timeout": 30,
+    # Requests per minute, per model
+    "rate_limits": {
+        "default": 500
+    },
+    "rate_limit_burst": 20
+}
+
+# Resilience Configuration (see src/resilience.py)
+RESILIENCE_CONFIG = {
+    # Seconds a whole turn may take, including retries and fallbacks
+    "deadline": 60,
+    # Seconds until the first streamed chunk
+    "first_token_timeout": 15,
+    # Seconds for a non-streamed call, or between two streamed chunks
+    "attempt_timeout": 30,
+    # Attempts per model on 429, 5xx, timeouts and connection errors
+    "max_attempts": 3,
+    # Jittered exponential backoff between attempts, in seconds
+    "backoff_base": 0.5,
+    "backoff_max": 8,
+    # Consecutive transient failures that open a model's circuit breaker,
+    # and seconds before a probe request is let through again
+    "breaker_failures": 5,
+    "breaker_reset": 30,
+    # Models tried in order when a model keeps failing or its breaker is open
+    "fallbacks": {
+        "gpt-4o": ["gpt-4o-mini", "gpt-4.1-nano"],
+        "gpt-4-turbo": ["gpt-4o", "gpt-4o-mini"],
+        "gpt-4o-mini": ["gpt-4.1-nano"],
+        "gpt-4.1-nano": ["gpt-4o-mini"],
+        "gpt-3.5-turbo": ["gpt-4o-mini", "gpt-4.1-nano"]
+    }
+}
+
+# Request Coalescing Configuration
+COALESCING_CONFIG = {
+    # Share one upstream call between identical in-flight requests
+    "enabled": True,
+    # Only coalesce early turns; longer histories are practically unique
+    "max_history_messages": 4,
+    # What a newer turn of the same session does to a running one:
+    # "cancel" stops it, "queue" waits for it to finish
+    "supersede": "cancel",
+    # Seconds a turn waits for the previous turn of its session
+    "turn_timeout": 120
+}
+
+# Shared HTTP Client Configuration
+HTTP_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    # Seconds an idle connection is kept open for reuse
+    "keepalive_expiry": 120,
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,
+    "http2": False,
+    # Retries are done by resilience.py, within the turn deadline
+    "max_retries": 0
+}
+
+# Shared State Configuration
+SHARED_STATE_CONFIG = {
+    # "sqlite" (shared by all replicas mounting the data volume) or "memory"
+    "backend": "sqlite",
+    "sqlite_path": "data/shared_state.sqlite3",
+    # Seconds between purges of expired rows from the SQLite backend
+    "purge_interval": 60
+}
+
+# Response Cache Configuration
+RESPONSE_CACHE_CONFIG = {
+    "enabled": False,
+    "max_entries": 1000,
+    "ttl": 86400,  # 1 day in seconds
+    # Only reuse answers at or below this temperature...
+    "max_temperature": 0.7,
+    # ...with temperatures grouped into buckets of this width
+    "temperature_bucket": 0.25,
+    # Only reuse answers early in a conversation
+    "max_history_messages": 2
+}
+
+# Metrics Configuration
+METRICS_CONFIG = {
+    # Serve Prometheus text format on http://<host>:<port>/metrics
+    "enabled": True,
+    "port": 9108,
+    "prefix": "drfreud",
+    # Turns kept for the live panel in the debug log
+    "recent_turns": 50,
+    # Turns per model used for live latency percentiles (model routing)
+    "latency_window": 100,
+    "latency_buckets": [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+}
+
 # UI Configuration
 UI_CONFIG = {
     "chat_container_height": 500,
@@ -40,6 +220,21 @@ UI_CONFIG = {
     "image_width": 200
 }
 
+# Static Asset Configuration (see src/assets.py)
+ASSET_CONFIG = {
+    # Built variants; Streamlit serves this folder under url_prefix
+    # (server.enableStaticServing in .streamlit/config.toml)
+    "static_dir": "static",
+    "url_prefix": "app/static",
+    # Pixel widths to build per image (1x and 2x for high-density screens);
+    # images not listed get image_width and twice that
+    "widths": {
+        "background": [1920]
+    },
+    # AVIF reaches the same visual quality at a lower setting
+    "quality": {"webp": 80, "avif": 50}
+}
+
 # Text Content
 TEXT_CONTENT = {
     "app_title": "Besprechen Sie das bitte mit Dr. Freud!",
@@ -49,7 +244,8 @@ TEXT_CONTENT = {
     "editor_subtitle": "Hier können Sie Einfluss auf Dr. Freuds Persönlichkeit nehmen",
     "settings_title": "⚙️ Settings",
     "personality_updated": "Dr. Freud's personality has been updated. The conversation is reset.",
-    "agent_init_message": "Initializing Dr. Freud's brain..."
+    "agent_init_message": "Initializing Dr. Freud's brain...",
+    "budget_exhausted": "Dr. Freud hat für heute genug gehört. Die Sprechstunde ist beendet, kommen Sie morgen wieder."
 }
 
 # Cache Configuration
@@ -57,6 +253,68 @@ CACHE_CONFIG = {
     "agent_ttl": 3600  # 1 hour in seconds
 }
 
+# Startup Configuration
+STARTUP_CONFIG = {
+    # Import the LLM stack, build the session's agent and open the upstream
+    # connection on background threads as soon as a session starts, instead
+    # of on its first chat turn (see src/warmup.py)
+    "background_warm_up": True,
+    "warm_up_workers": 2,
+    # Seconds between pings keeping the pooled connection open while
+    # sessions are active; below HTTP_CONFIG["keepalive_expiry"]
+    "keepalive_interval": 90,
+    # Also warm up right away when the model settings or persona change
+    "prefetch_on_change": True
+}
+
+# Conversation Persistence Configuration
+CONVERSATION_CONFIG = {
+    "backend": "sqlite",
+    "sqlite_path": "data/conversations.sqlite3",
+    # Messages kept in memory per session; older ones that are already
+    # summarized are only kept in the store
+    "memory_window": 40
+}
+
+# Session Lifecycle Configuration (see src/session_lifecycle.py)
+SESSION_LIFECYCLE_CONFIG = {
+    # Spill idle sessions to disk and release their memory
+    "enabled": True,
+    # Seconds without a run after which a session is evicted
+    "idle_ttl": 1800,
+    # Seconds between reaper passes
+    "reap_interval": 60,
+    # State of evicted sessions that is not in the conversation store
+    "spill_dir": "data/sessions",
+    # Seconds after which spill files of sessions that never returned are removed
+    "spill_ttl": 7 * 86400
+}
+
+# Preset Store Configuration
+PRESET_CONFIG = {
+    # "sqlite" (versioned, safe for concurrent editors) or "file" (.txt files)
+    "backend": "sqlite",
+    # Lives on the shared presets volume; created from presets/*.txt on first start
+    "sqlite_path": "presets/presets.sqlite3",
+    # Seconds a writer waits for another writer's lock
+    "busy_timeout": 10,
+    # Seconds after which the "file" backend rebuilds its index even if the
+    # directory looks unchanged (catches files edited in place)
+    "rescan_interval": 60
+}
+
+# Preset Evaluation Configuration (evals/batch_eval.py)
+EVAL_CONFIG = {
+    "corpus_path": "evals/corpus.jsonl",
+    "output_path": "evals/results.jsonl",
+    # Parallel conversations in online mode; the engine still applies its
+    # own concurrency and rate limits
+    "workers": 8,
+    # Batch API mode: results within this window at a lower price
+    "batch_completion_window": "24h",
+    "batch_poll_interval": 30
+}
+
 # File Paths
 PATHS = {
     "presets_dir": "presets",
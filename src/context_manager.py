@@ -0,0 +1,105 @@
+"""
+Context window management for Dr. Freud AI Chatbot.
+Keeps the history sent to the agent within a per-model token budget by
+folding older turns into a running summary.
+"""
+
+import threading
+import time
+import streamlit as st
+from .config import CONTEXT_CONFIG, TEXT_CONTENT
+from .prompts import SUMMARY_PROMPT
+
+# When summarization last failed; a failing summarizer is not retried on
+# every turn, each of which would wait for it before its first token
+_summary_failed_at = float("-inf")
+_summary_lock = threading.Lock()
+
+def get_token_budget(model_name):
+    """Get the history token budget for a model."""
+    return CONTEXT_CONFIG["token_budgets"].get(model_name, CONTEXT_CONFIG["default_token_budget"])
+
+def _format_messages(messages):
+    """Format chat messages as plain text for the summarizer."""
+    return "\n".join(
+        f"{msg['role'].capitalize()}: {msg['content']}"
+        for msg in messages
+    )
+
+def _summarize(previous_summary, messages):
+    """Fold messages into the previous summary. Returns None on failure or while backing off."""
+    global _summary_failed_at
+    from . import accounting, resilience
+    from .agent_manager import get_usage_stats, require_agent
+    from .session_manager import estimate_tokens
+
+    request = (
+        f"Bisherige Zusammenfassung:\n{previous_summary or '(keine)'}\n\n"
+        f"Neue Gesprächsteile:\n{_format_messages(messages)}"
+    )
+
+    def make_call(model_name):
+        agent = require_agent(model_name, CONTEXT_CONFIG["summary_temperature"], False, SUMMARY_PROMPT)
+        return lambda: agent.run(request)
+
+    with _summary_lock:
+        if time.monotonic() - _summary_failed_at < CONTEXT_CONFIG["summary_retry_after"]:
+            return None
+    timings = {}
+    try:
+        result = resilience.run(CONTEXT_CONFIG["summary_model"], make_call, timings=timings)
+    except Exception as e:
+        print(f"[DEBUG] Summarization failed, sending full history for {CONTEXT_CONFIG['summary_retry_after']}s: {str(e)}")
+        with _summary_lock:
+            _summary_failed_at = time.monotonic()
+        return None
+    # Summaries count against the global budget only
+    served_model = timings.get("fallback_model") or CONTEXT_CONFIG["summary_model"]
+    accounting.record_usage(None, served_model, get_usage_stats(result.usage))
+    return result.output, estimate_tokens(result.output)
+
+def fold_history(model_name, messages, message_tokens, summary, summary_tokens, summarized_count):
+    """Fold older turns into the summary if the window is over budget.
+
+    Works on plain values so it can be used outside Streamlit (see api.py).
+    Returns the new (summary, summary_tokens, summarized_count).
+    """
+    keep_from = len(messages) - 2 * CONTEXT_CONFIG["recent_turns"]
+    # Fold whole turns only, so the kept history starts with a user message
+    keep_from -= keep_from % 2
+
+    window_tokens = summary_tokens + sum(message_tokens[summarized_count:])
+    # Only fold when over budget and there are old turns left to fold
+    if window_tokens > get_token_budget(model_name) and keep_from > summarized_count:
+        result = _summarize(summary, messages[summarized_count:keep_from])
+        if result is not None:
+            print(f"[DEBUG] Folded history up to message {keep_from} into summary")
+            return result[0], result[1], keep_from
+    return summary, summary_tokens, summarized_count
+
+def get_context_window(model_name):
+    """Get the message history to send, summarizing older turns if over budget."""
+    from .agent_manager import summary_message
+    from .session_manager import persist_summary
+
+    state = st.session_state
+    # Folding waits for a summary call before the turn can start
+    with st.spinner(TEXT_CONTENT["thinking_message"]):
+        folded = fold_history(
+            model_name, state.messages, state.message_tokens,
+            state.summary, state.summary_tokens, state.summarized_count
+        )
+    if folded[2] != state.summarized_count:
+        state.summary, state.summary_tokens, state.summarized_count = folded
+        persist_summary()
+
+    history = state.model_messages[state.summarized_count:]
+    if state.summary:
+        return [summary_message(state.summary)] + history
+    return history
+
+def reset_context():
+    """Reset the running summary."""
+    st.session_state.summary = ""
+    st.session_state.summary_tokens = 0
+    st.session_state.summarized_count = 0
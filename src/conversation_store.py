@@ -0,0 +1,134 @@
+"""
+Conversation persistence for Dr. Freud AI Chatbot.
+Stores every turn outside st.session_state so sessions survive restarts and
+reconnects, and can be reloaded lazily by session ID.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from .config import CONVERSATION_CONFIG
+
+class ConversationStore(ABC):
+    """Interface for conversation stores.
+
+    Messages are addressed by their absolute position in the session, so a
+    caller holding only a window of recent messages can keep appending.
+    """
+
+    @abstractmethod
+    def create_session(self, prompt):
+        """Create a session for a system prompt and return its ID."""
+
+    @abstractmethod
+    def load_session(self, session_id):
+        """Get a session's prompt, summary and message count, or None if unknown."""
+
+    @abstractmethod
+    def append_message(self, session_id, position, role, content):
+        """Persist one message at an absolute position."""
+
+    @abstractmethod
+    def load_messages(self, session_id, start=0):
+        """Get the session's messages from an absolute position onwards."""
+
+    @abstractmethod
+    def save_summary(self, session_id, summary, summarized_until):
+        """Persist the running summary covering messages before summarized_until."""
+
+class SqliteConversationStore(ConversationStore):
+    """Conversation store backed by a local SQLite database (WAL mode)."""
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_until INTEGER NOT NULL DEFAULT 0,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL REFERENCES sessions(id),
+                position INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, position)
+            );
+        """)
+
+    def create_session(self, prompt):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (id, prompt, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, prompt, now, now)
+            )
+        return session_id
+
+    def load_session(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT prompt, summary, summarized_until, message_count FROM sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        prompt, summary, summarized_until, message_count = row
+        return {
+            "prompt": prompt,
+            "summary": summary,
+            "summarized_until": summarized_until,
+            "message_count": message_count
+        }
+
+    def append_message(self, session_id, position, role, content):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO messages (session_id, position, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, position, role, content, now)
+            )
+            self._conn.execute(
+                "UPDATE sessions SET message_count = MAX(message_count, ?), updated_at = ? WHERE id = ?",
+                (position + 1, now, session_id)
+            )
+
+    def load_messages(self, session_id, start=0):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND position >= ? ORDER BY position",
+                (session_id, start)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def save_summary(self, session_id, summary, summarized_until):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, summarized_until = ?, updated_at = ? WHERE id = ?",
+                (summary, summarized_until, time.time(), session_id)
+            )
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_conversation_store():
+    """Get the process-wide conversation store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if CONVERSATION_CONFIG["backend"] != "sqlite":
+                raise ValueError(f"Unknown conversation store backend: {CONVERSATION_CONFIG['backend']}")
+            _store = SqliteConversationStore(CONVERSATION_CONFIG["sqlite_path"])
+    return _store
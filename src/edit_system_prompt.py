@@ -1,35 +1,29 @@
 import streamlit as st
-import os
-from pathlib import Path
+from .preset_store import get_preset_store
 
-def save_preset(preset_name, prompt_text):
+def get_author():
+    """Identify this session in the preset history (there are no user accounts)"""
+    return f"session:{st.session_state.turn_key}"
+
+def save_preset(preset_name, prompt_text, author=None):
     """Save the current prompt as a preset"""
-    presets_dir = Path("presets")
-    presets_dir.mkdir(exist_ok=True)
-    preset_file = presets_dir / f"{preset_name}.txt"
-    preset_file.write_text(prompt_text)
-    return str(preset_file)
+    return get_preset_store().save(preset_name, prompt_text, author=author)
 
 def load_presets():
     """Load all available presets"""
-    presets_dir = Path("presets")
-    presets_dir.mkdir(exist_ok=True)
-    return [f.stem for f in presets_dir.glob("*.txt")]
+    return get_preset_store().list_names()
 
 def load_preset(preset_name):
     """Load a specific preset"""
-    preset_file = Path("presets") / f"{preset_name}.txt"
-    if preset_file.exists():
-        return preset_file.read_text()
-    return ""
+    return get_preset_store().get(preset_name)
+
+def find_preset(prompt_text):
+    """Find the preset whose content matches the prompt, if any"""
+    return get_preset_store().find_by_content(prompt_text)
 
-def delete_preset(preset_name):
+def delete_preset(preset_name, author=None):
     """Delete a specific preset"""
-    preset_file = Path("presets") / f"{preset_name}.txt"
-    if preset_file.exists():
-        os.remove(preset_file)
-        return True
-    return False
+    return get_preset_store().delete(preset_name, author=author)
 
 def show_prompt_editor():
     """Show the system prompt editor interface"""
@@ -41,19 +35,15 @@ def show_prompt_editor():
     # If no presets exist, create a default one
     if not presets:
         default_preset = "default"
-        save_preset(default_preset, st.session_state.prompt_editor)
+        save_preset(default_preset, st.session_state.prompt_editor, author=get_author())
         presets = [default_preset]
     
     # Create columns for preset controls
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        # Find if current prompt matches any preset
-        current_preset = None
-        for preset in presets:
-            if load_preset(preset) == st.session_state.prompt_editor:
-                current_preset = preset
-                break
+        # Find if current prompt matches any preset (hash index lookup)
+        current_preset = find_preset(st.session_state.prompt_editor)
         
         # Set the default index to the current preset or 0
         default_index = presets.index(current_preset) + 1 if current_preset in presets else 0
@@ -72,13 +62,13 @@ def show_prompt_editor():
             if st.button("Laden", key="load_preset_btn"):
                 if selected_preset:
                     st.session_state.prompt_editor = load_preset(selected_preset)
-                    st.rerun()
+                    st.rerun(scope="fragment")
         with col2_2:
             if st.button("Löschen", key="delete_preset_btn"):
                 if selected_preset:
-                    delete_preset(selected_preset)
+                    delete_preset(selected_preset, author=get_author())
                     st.toast(f'Voreinstellung "{selected_preset}" wurde gelöscht.')
-                    st.rerun()
+                    st.rerun(scope="fragment")
     
     # Add CSS for the apply button
     st.markdown("""
@@ -118,7 +108,7 @@ def show_prompt_editor():
     with new_preset_col2:
         st.write("\n")  # For vertical alignment
         if st.button("Voreinstellung speichern") and new_preset_name:
-            save_preset(new_preset_name, prompt_text)
+            save_preset(new_preset_name, prompt_text, author=get_author())
             st.success(f"Gespeichert als '{new_preset_name}'")
     
     # Apply button
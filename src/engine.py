@@ -0,0 +1,122 @@
+"""
+Async chat engine for Dr. Freud AI Chatbot.
+Runs all agent calls on one shared event loop with a global concurrency
+limit, per-model rate limiting and a bounded queue with backpressure.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from .config import ENGINE_CONFIG
+
+class EngineBusyError(RuntimeError):
+    """Raised when the engine queue is full and a request cannot be accepted."""
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphore = None
+_rate_limiters = {}
+
+# Slots for requests that were accepted but have not finished yet
+_queue_slots = threading.BoundedSemaphore(ENGINE_CONFIG["max_queue"])
+
+class _RateLimiter:
+    """Token bucket limiting requests per minute for one model."""
+
+    def __init__(self, requests_per_minute, burst):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.updated = time.monotonic()
+                self.tokens = 1
+            self.tokens -= 1
+
+def get_loop():
+    """Get the shared event loop, starting its thread on first use."""
+    global _loop, _semaphore
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="chat-engine", daemon=True).start()
+            _semaphore = asyncio.Semaphore(ENGINE_CONFIG["max_concurrency"])
+            _loop = loop
+    return _loop
+
+def _get_rate_limiter(model_name):
+    """Get the rate limiter for a model (only called on the engine loop)."""
+    if model_name not in _rate_limiters:
+        limits = ENGINE_CONFIG["rate_limits"]
+        requests_per_minute = limits.get(model_name, limits["default"])
+        _rate_limiters[model_name] = _RateLimiter(requests_per_minute, ENGINE_CONFIG["rate_limit_burst"])
+    return _rate_limiters[model_name]
+
+def _acquire_slot():
+    """Reserve a queue slot, waiting up to queue_timeout before rejecting."""
+    if not _queue_slots.acquire(timeout=ENGINE_CONFIG["queue_timeout"]):
+        raise EngineBusyError("Chat engine queue is full")
+
+async def _limited(model_name, coro_factory, submitted, timings):
+    """Run a coroutine under the model's rate limit and the global semaphore."""
+    # Rate limited first, so a request waiting for its model's next token
+    # never holds a concurrency slot other models could use
+    await _get_rate_limiter(model_name).acquire()
+    async with _semaphore:
+        if timings is not None:
+            timings["queue_wait"] = time.perf_counter() - submitted
+        return await coro_factory()
+
+def submit(model_name, coro_factory, timings=None):
+    """Submit a coroutine factory to the engine and return a concurrent future.
+
+    If a timings dict is given, the time spent waiting for a queue slot,
+    the concurrency limit and the rate limit is stored as "queue_wait".
+    """
+    loop = get_loop()
+    submitted = time.perf_counter()
+    _acquire_slot()
+    try:
+        future = asyncio.run_coroutine_threadsafe(_limited(model_name, coro_factory, submitted, timings), loop)
+    except BaseException:
+        _queue_slots.release()
+        raise
+    future.add_done_callback(lambda _: _queue_slots.release())
+    return future
+
+def run(model_name, coro_factory, timings=None):
+    """Run a coroutine factory on the engine and wait for its result."""
+    return submit(model_name, coro_factory, timings).result()
+
+def stream(model_name, agen_factory, timings=None):
+    """Run an async generator factory on the engine and yield its items here."""
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        async for item in agen_factory():
+            items.put(item)
+
+    future = submit(model_name, pump, timings)
+    # Also wakes the consumer if the engine fails before pump() ever runs
+    future.add_done_callback(lambda _: items.put(done))
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            yield item
+        # Re-raise any error from the engine side
+        future.result()
+    finally:
+        if not future.done():
+            future.cancel()
@@ -0,0 +1,42 @@
+"""
+Shared HTTP client for Dr. Freud AI Chatbot.
+One pooled OpenAI client is created per process and injected into every
+model, so all agents share the same keep-alive connections. The client is
+only used from the engine loop (see engine.py).
+"""
+
+import threading
+import httpx
+from openai import AsyncOpenAI
+from pydantic_ai.providers.openai import OpenAIProvider
+from .config import HTTP_CONFIG
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def _create_http_client():
+    """Create the pooled async HTTP client from HTTP_CONFIG."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_CONFIG["max_connections"],
+            max_keepalive_connections=HTTP_CONFIG["max_keepalive_connections"],
+            keepalive_expiry=HTTP_CONFIG["keepalive_expiry"]
+        ),
+        timeout=httpx.Timeout(
+            HTTP_CONFIG["read_timeout"],
+            connect=HTTP_CONFIG["connect_timeout"]
+        ),
+        http2=HTTP_CONFIG["http2"]
+    )
+
+def get_provider():
+    """Get the process-wide OpenAI provider backed by the pooled client."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            client = AsyncOpenAI(
+                http_client=_create_http_client(),
+                max_retries=HTTP_CONFIG["max_retries"]
+            )
+            _provider = OpenAIProvider(openai_client=client)
+    return _provider
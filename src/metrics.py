@@ -0,0 +1,200 @@
+"""
+Per-turn instrumentation for Dr. Freud AI Chatbot.
+Records latency, token and cache figures for every turn, emits them as JSON
+logs and exposes aggregates in Prometheus text format.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import METRICS_CONFIG
+
+# One JSON object per line on stdout, independent of Streamlit's logging
+logger = logging.getLogger("drfreud.metrics")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_lock = threading.Lock()
+_recent = deque(maxlen=METRICS_CONFIG["recent_turns"])
+_counters = defaultdict(float)
+_histograms = {}
+_model_latencies = defaultdict(lambda: deque(maxlen=METRICS_CONFIG["latency_window"]))
+_server = None
+_server_started = False
+
+# Timings recorded per turn, in seconds
+TIMINGS = ("queue_wait", "time_to_first_token", "total_latency")
+
+def _counter_increments(turn):
+    """Counter increments contributed by one turn."""
+    return {
+        "turns_total": 1,
+        "errors_total": 1 if turn["error"] else 0,
+        "response_cache_hits_total": 1 if turn["response_cache_hit"] else 0,
+        "coalesced_total": 1 if turn["coalesced"] else 0,
+        "retries_total": turn["retries"],
+        "fallbacks_total": 1 if turn["fallback_model"] else 0,
+        "budget_degraded_total": 1 if turn["budget"] == "degraded" else 0,
+        "budget_refused_total": 1 if turn["budget"] == "exhausted" else 0,
+        "cost_usd_total": turn["cost"],
+        "input_tokens_total": turn["input_tokens"],
+        "output_tokens_total": turn["output_tokens"],
+        "cached_tokens_total": turn["cached_tokens"]
+    }
+
+COUNTERS = (
+    "turns_total",
+    "errors_total",
+    "response_cache_hits_total",
+    "coalesced_total",
+    "retries_total",
+    "fallbacks_total",
+    "budget_degraded_total",
+    "budget_refused_total",
+    "cost_usd_total",
+    "input_tokens_total",
+    "output_tokens_total",
+    "cached_tokens_total"
+)
+
+def new_turn(model_name, preset, prompt_chars, history_messages):
+    """Start a turn record; fill in the remaining fields while the turn runs."""
+    return {
+        "timestamp": time.time(),
+        "model": model_name,
+        "preset": preset,
+        "prompt_chars": prompt_chars,
+        "history_messages": history_messages,
+        "context_tokens": None,
+        "queue_wait": None,
+        "time_to_first_token": None,
+        "total_latency": None,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "cost": 0.0,
+        "response_cache_hit": False,
+        "coalesced": False,
+        "retries": 0,
+        "fallback_model": None,
+        "routed": False,
+        "budget": "ok",
+        "error": None,
+        "_start": time.perf_counter()
+    }
+
+def elapsed(turn):
+    """Seconds since the turn started."""
+    return time.perf_counter() - turn["_start"]
+
+def record_turn(turn):
+    """Finish a turn: log it as JSON and add it to the aggregates."""
+    turn = {key: value for key, value in turn.items() if not key.startswith("_")}
+    logger.info(json.dumps(turn, ensure_ascii=False))
+
+    labels = (turn["model"], turn["preset"])
+    with _lock:
+        _recent.append(turn)
+        for name, value in _counter_increments(turn).items():
+            _counters[(name, labels)] += value
+        for name in TIMINGS:
+            if turn[name] is not None:
+                _observe(name, labels, turn[name])
+        # Live latency of the model that actually answered; failed turns
+        # count with their full latency
+        if not turn["response_cache_hit"] and not turn["coalesced"] and turn["budget"] != "exhausted":
+            latency = turn["total_latency"] if turn["error"] else turn["time_to_first_token"]
+            if latency is not None:
+                _model_latencies[turn["fallback_model"] or turn["model"]].append(latency)
+
+def _observe(name, labels, value):
+    """Add an observation to a latency histogram (caller holds the lock)."""
+    buckets = METRICS_CONFIG["latency_buckets"]
+    histogram = _histograms.setdefault((name, labels), {"counts": [0] * len(buckets), "sum": 0.0, "count": 0})
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            histogram["counts"][i] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+def get_latency_percentile(model_name, fraction, min_samples=1):
+    """Get a percentile of a model's recent time to first token, or None with too few samples."""
+    with _lock:
+        samples = sorted(_model_latencies.get(model_name, ()))
+    if len(samples) < max(min_samples, 1):
+        return None
+    return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))]
+
+def get_recent_turns():
+    """Get the most recent turn records, newest first."""
+    with _lock:
+        return list(reversed(_recent))
+
+def _format_labels(labels, extra=""):
+    model_name, preset = labels
+    return f'model="{model_name}",preset="{preset}"{extra}'
+
+def render_prometheus():
+    """Render all aggregates in Prometheus text exposition format."""
+    prefix = METRICS_CONFIG["prefix"]
+    lines = []
+    with _lock:
+        for name in COUNTERS:
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for (counter, labels), value in sorted(_counters.items()):
+                if counter == name:
+                    lines.append(f"{prefix}_{name}{{{_format_labels(labels)}}} {value:g}")
+        for name in TIMINGS:
+            lines.append(f"# TYPE {prefix}_{name}_seconds histogram")
+            for (histogram_name, labels), histogram in sorted(_histograms.items()):
+                if histogram_name != name:
+                    continue
+                bounds = [f"{bound:g}" for bound in METRICS_CONFIG["latency_buckets"]] + ["+Inf"]
+                counts = histogram["counts"] + [histogram["count"]]
+                for bound, count in zip(bounds, counts):
+                    le = f',le="{bound}"'
+                    lines.append(f"{prefix}_{name}_seconds_bucket{{{_format_labels(labels, le)}}} {count}")
+                lines.append(f"{prefix}_{name}_seconds_sum{{{_format_labels(labels)}}} {histogram['sum']:g}")
+                lines.append(f"{prefix}_{name}_seconds_count{{{_format_labels(labels)}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the Prometheus text endpoint."""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server():
+    """Start the /metrics endpoint once per process, if enabled."""
+    global _server, _server_started
+    if not METRICS_CONFIG["enabled"]:
+        return
+    with _lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", METRICS_CONFIG["port"]), _MetricsHandler)
+        except OSError as e:
+            print(f"[DEBUG] Metrics server not started: {str(e)}")
+            return
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
@@ -0,0 +1,303 @@
+"""
+Preset storage for Dr. Freud AI Chatbot.
+Keeps an in-memory index of all presets (by name and by content hash) that
+is only rebuilt when the underlying storage changes, so rendering the prompt
+editor costs the same no matter how many presets exist.
+
+Two backends are available (PRESET_CONFIG["backend"]): plain .txt files, or
+SQLite with version history. Bulk import/export between them:
+
+    python -m src.preset_store import presets/
+    python -m src.preset_store export presets/
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from .config import PATHS, PRESET_CONFIG
+
+def content_hash(text):
+    """Hash identifying a preset's content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class FilePresetStore:
+    """Presets stored as <name>.txt files in one directory."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.RLock()
+        self._contents = {}
+        self._by_hash = {}
+        self._names = []
+        self._dir_mtime = None
+        self._checked_at = 0.0
+
+    def _path(self, name):
+        return self.directory / f"{name}.txt"
+
+    def _refresh(self):
+        """Rebuild the index if the directory changed (caller holds the lock)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        # Directory mtime catches files added, removed or atomically
+        # replaced; the periodic rescan catches edits made in place
+        stale = time.monotonic() - self._checked_at > PRESET_CONFIG["rescan_interval"]
+        if dir_mtime == self._dir_mtime and not stale:
+            return
+        contents = {}
+        for preset_file in self.directory.glob("*.txt"):
+            try:
+                contents[preset_file.stem] = preset_file.read_text()
+            except OSError:
+                continue
+        self._contents = contents
+        self._names = sorted(contents)
+        self._by_hash = {}
+        for name in self._names:
+            self._by_hash.setdefault(content_hash(contents[name]), name)
+        self._dir_mtime = dir_mtime
+        self._checked_at = time.monotonic()
+
+    def list_names(self):
+        """Get all preset names, sorted."""
+        with self._lock:
+            self._refresh()
+            return list(self._names)
+
+    def get(self, name):
+        """Get a preset's content, or "" if it does not exist."""
+        with self._lock:
+            self._refresh()
+            return self._contents.get(name, "")
+
+    def find_by_content(self, text):
+        """Get the name of a preset with exactly this content, or None."""
+        with self._lock:
+            self._refresh()
+            return self._by_hash.get(content_hash(text))
+
+    def save(self, name, text, author=None):
+        """Write a preset atomically; returns its path. Files keep no author."""
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(name)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as tmp_file:
+                    tmp_file.write(text)
+                    tmp_file.flush()
+                    os.fsync(tmp_file.fileno())
+                # mkstemp creates files readable by the owner only
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+            self._dir_mtime = None
+            return str(path)
+
+    def delete(self, name, author=None):
+        """Delete a preset; returns False if it did not exist."""
+        with self._lock:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                return False
+            self._dir_mtime = None
+            return True
+
+class SqlitePresetStore:
+    """Presets stored in SQLite (WAL mode) with version history.
+
+    Every save appends a version with author and timestamp; identical
+    contents are stored once and shared by hash. The in-memory index is
+    rebuilt only when PRAGMA data_version reports a commit from any
+    connection, including other processes and replicas.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(path), timeout=PRESET_CONFIG["busy_timeout"], check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS contents (
+                hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS presets (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                content_hash TEXT NOT NULL REFERENCES contents(hash),
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS preset_versions (
+                name TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                content_hash TEXT REFERENCES contents(hash),
+                author TEXT,
+                created_at REAL NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, version)
+            );
+            CREATE INDEX IF NOT EXISTS presets_by_hash ON presets(content_hash);
+        """)
+        self._contents = {}
+        self._by_hash = {}
+        self._names = []
+        self._data_version = None
+
+    def _refresh(self):
+        """Rebuild the index if the database changed (caller holds the lock)."""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        rows = self._conn.execute(
+            "SELECT presets.name, presets.content_hash, contents.text "
+            "FROM presets JOIN contents ON contents.hash = presets.content_hash ORDER BY presets.name"
+        ).fetchall()
+        self._contents = {name: text for name, _, text in rows}
+        self._names = [name for name, _, _ in rows]
+        self._by_hash = {}
+        for name, text_hash, _ in rows:
+            self._by_hash.setdefault(text_hash, name)
+        self._data_version = data_version
+
+    def list_names(self):
+        """Get all preset names, sorted."""
+        with self._lock:
+            self._refresh()
+            return list(self._names)
+
+    def get(self, name):
+        """Get a preset's content, or "" if it does not exist."""
+        with self._lock:
+            self._refresh()
+            return self._contents.get(name, "")
+
+    def find_by_content(self, text):
+        """Get the name of a preset with exactly this content, or None."""
+        with self._lock:
+            self._refresh()
+            return self._by_hash.get(content_hash(text))
+
+    def _add_version(self, name, text_hash, author, deleted=False):
+        """Append a version row and return its number (caller holds a write transaction)."""
+        version = self._conn.execute(
+            "SELECT COALESCE(MAX(version), 0) + 1 FROM preset_versions WHERE name = ?", (name,)
+        ).fetchone()[0]
+        self._conn.execute(
+            "INSERT INTO preset_versions (name, version, content_hash, author, created_at, deleted) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, version, text_hash, author, time.time(), int(deleted))
+        )
+        return version
+
+    def save(self, name, text, author=None):
+        """Save a new version of a preset; unchanged content adds no version."""
+        text_hash = content_hash(text)
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so concurrent editors
+            # queue instead of overwriting each other's version numbers
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._conn.execute("SELECT content_hash FROM presets WHERE name = ?", (name,)).fetchone()
+                if current is None or current[0] != text_hash:
+                    self._conn.execute("INSERT OR IGNORE INTO contents (hash, text) VALUES (?, ?)", (text_hash, text))
+                    version = self._add_version(name, text_hash, author)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO presets (name, version, content_hash, updated_at) VALUES (?, ?, ?, ?)",
+                        (name, version, text_hash, time.time())
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # data_version only changes for commits from other connections
+            self._data_version = None
+            return name
+
+    def delete(self, name, author=None):
+        """Delete a preset, keeping its history; returns False if it did not exist."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._conn.execute("DELETE FROM presets WHERE name = ?", (name,)).rowcount > 0
+                if deleted:
+                    self._add_version(name, None, author, deleted=True)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # data_version only changes for commits from other connections
+            self._data_version = None
+            return deleted
+
+    def history(self, name):
+        """Get all versions of a preset, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, author, created_at, deleted, contents.text FROM preset_versions "
+                "LEFT JOIN contents ON contents.hash = preset_versions.content_hash "
+                "WHERE name = ? ORDER BY version DESC",
+                (name,)
+            ).fetchall()
+        return [
+            {"version": version, "author": author, "created_at": created_at, "deleted": bool(deleted), "text": text}
+            for version, author, created_at, deleted, text in rows
+        ]
+
+    def is_empty(self):
+        """Check whether the store has never held any preset."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM preset_versions LIMIT 1").fetchone() is None
+
+def import_directory(store, directory, author="import"):
+    """Import every <name>.txt file from a directory into a store; returns the count."""
+    count = 0
+    for preset_file in sorted(Path(directory).glob("*.txt")):
+        store.save(preset_file.stem, preset_file.read_text(), author=author)
+        count += 1
+    return count
+
+def export_directory(store, directory):
+    """Export every preset of a store as <name>.txt files; returns the count."""
+    target = FilePresetStore(directory)
+    names = store.list_names()
+    for name in names:
+        target.save(name, store.get(name))
+    return len(names)
+
+_store = None
+_store_lock = threading.Lock()
+
+def _create_store():
+    """Create the store selected in PRESET_CONFIG."""
+    if PRESET_CONFIG["backend"] != "sqlite":
+        return FilePresetStore(PATHS["presets_dir"])
+    store = SqlitePresetStore(PRESET_CONFIG["sqlite_path"])
+    # First start on SQLite: take over the existing .txt presets
+    if store.is_empty():
+        import_directory(store, PATHS["presets_dir"])
+    return store
+
+def get_preset_store():
+    """Get the process-wide preset store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = _create_store()
+    return _store
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        sys.exit("Usage: python -m src.preset_store import|export <directory>")
+    store = SqlitePresetStore(PRESET_CONFIG["sqlite_path"])
+    if sys.argv[1] == "import":
+        print(f"Imported {import_directory(store, sys.argv[2])} presets")
+    else:
+        print(f"Exported {export_directory(store, sys.argv[2])} presets")
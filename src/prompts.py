@@ -59,3 +59,10 @@ Ah! Fantastisch. Heureka! Ein Kollege!
 Dann wissen Sie sicher bereits, wie bahnbrechend meine Arbeit zur Triebstruktur war.
 Natürlich sind meine Konzepte... zeitlos.
 """
+
+# Prompt for folding older conversation turns into a running summary
+SUMMARY_PROMPT = """Du fasst ein laufendes Gespräch zwischen einem Nutzer und Dr. Freud zusammen.
+Du erhältst die bisherige Zusammenfassung und neue Gesprächsteile.
+Erstelle eine aktualisierte, knappe Zusammenfassung auf Deutsch.
+Behalte Namen, Fakten über den Nutzer, offene Fragen und den Tonfall des Gesprächs bei.
+Antworte nur mit der Zusammenfassung, ohne Einleitung."""
@@ -0,0 +1,258 @@
+"""
+Resilience layer for Dr. Freud AI Chatbot.
+Wraps engine calls with deadlines, jittered exponential retries on
+transient errors (429, 5xx, timeouts, connection errors), a circuit breaker
+per model and a fallback chain of cheaper or more available models, so a
+provider incident costs a bounded amount of time instead of hanging turns.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import httpx
+import openai
+from .config import AVAILABLE_MODELS, RESILIENCE_CONFIG
+from . import engine
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call does not answer within its time limit."""
+
+class CircuitOpenError(RuntimeError):
+    """Raised when every model of the fallback chain is unavailable."""
+
+class CircuitBreaker:
+    """Stops calling a failing model for a while.
+
+    After breaker_failures consecutive transient failures the breaker opens
+    and calls are refused for breaker_reset seconds. Then a single probe
+    call is let through: success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Check whether a call may go through (claims the probe when half-open)."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, success):
+        """Record a call outcome: True, False, or None if it ended without one."""
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            elif success is False:
+                self.failures += 1
+                if self.probing or self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+            self.probing = False
+
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None
+
+    def get_state(self):
+        """Get "closed", "open" or "half-open"."""
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(model_name):
+    """Get the circuit breaker of a model."""
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(
+                RESILIENCE_CONFIG["breaker_failures"],
+                RESILIENCE_CONFIG["breaker_reset"]
+            )
+        return _breakers[model_name]
+
+def get_breaker_states():
+    """Get the state of every model's circuit breaker."""
+    with _breakers_lock:
+        return {model_name: breaker.get_state() for model_name, breaker in _breakers.items()}
+
+def get_fallback_chain(model_name):
+    """Get the models to try for a request, the requested one first."""
+    fallbacks = RESILIENCE_CONFIG["fallbacks"].get(model_name, [])
+    return [model_name] + [m for m in fallbacks if m in AVAILABLE_MODELS and m != model_name]
+
+def _error_chain(error):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+def is_retryable(error):
+    """Check whether an error is transient (rate limit, server error, timeout, network)."""
+    for e in _error_chain(error):
+        if isinstance(e, engine.EngineBusyError):
+            # Local overload; retrying would only add load
+            return False
+        status_code = getattr(e, "status_code", None)
+        if isinstance(status_code, int):
+            return status_code in (408, 429) or status_code >= 500
+        if isinstance(e, (TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError)):
+            return True
+    return False
+
+def _retry_after(error):
+    """Get the server's Retry-After delay in seconds, if it sent one."""
+    for e in _error_chain(error):
+        response = getattr(e, "response", None)
+        value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+def _backoff(attempt, error, deadline):
+    """Sleep before the next attempt: full jitter, or the server's Retry-After."""
+    delay = _retry_after(error)
+    if delay is None:
+        cap = min(RESILIENCE_CONFIG["backoff_max"], RESILIENCE_CONFIG["backoff_base"] * 2 ** attempt)
+        delay = random.uniform(0, cap)
+    time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+def _time_limit(limit, deadline):
+    """Loop time at which a step limited to `limit` seconds must have finished."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Turn deadline exceeded")
+    return asyncio.get_running_loop().time() + min(limit, remaining)
+
+def _with_timeouts(agen_factory, deadline):
+    """Bound the first chunk, the gaps between chunks and the whole stream."""
+    # asyncio.timeout keeps the stream in its own task: pydantic_ai's
+    # context variables must be entered and reset in the same one
+    async def timed():
+        try:
+            async with asyncio.timeout_at(_time_limit(RESILIENCE_CONFIG["first_token_timeout"], deadline)) as timeout:
+                async for chunk in agen_factory():
+                    timeout.reschedule(_time_limit(RESILIENCE_CONFIG["attempt_timeout"], deadline))
+                    yield chunk
+        except TimeoutError as e:
+            raise DeadlineExceeded("No response within the time limit") from e
+    return timed
+
+def _with_timeout(coro_factory, deadline):
+    """Bound a single call by attempt_timeout and the remaining deadline."""
+    async def timed():
+        try:
+            async with asyncio.timeout_at(_time_limit(RESILIENCE_CONFIG["attempt_timeout"], deadline)):
+                return await coro_factory()
+        except TimeoutError as e:
+            raise DeadlineExceeded("No response within the time limit") from e
+    return timed
+
+def _start(timings):
+    timings.setdefault("retries", 0)
+    return time.monotonic() + RESILIENCE_CONFIG["deadline"]
+
+def _attempts(model_name, timings, deadline, failures):
+    """Yield (model, breaker) for every attempt allowed by breakers and deadline.
+
+    The caller appends each transient failure to failures before asking for
+    the next attempt.
+    """
+    for candidate in get_fallback_chain(model_name):
+        breaker = get_breaker(candidate)
+        if not breaker.allow():
+            print(f"[DEBUG] Circuit open, skipping {candidate}")
+            continue
+        for attempt in range(RESILIENCE_CONFIG["max_attempts"]):
+            if attempt > 0:
+                # The previous attempt failed transiently (see the callers)
+                if breaker.is_open() or time.monotonic() >= deadline:
+                    break
+                timings["retries"] += 1
+                _backoff(attempt - 1, failures[-1], deadline)
+            if candidate != model_name:
+                timings["fallback_model"] = candidate
+            yield candidate, breaker
+        if time.monotonic() >= deadline:
+            return
+
+def _give_up(model_name, failures):
+    if failures:
+        raise failures[-1]
+    raise CircuitOpenError(f"No model available for {model_name}")
+
+def run(model_name, make_call, timings=None):
+    """Run a call with deadline, retries, circuit breakers and fallbacks.
+
+    make_call(model) is called in this thread for every attempt and returns
+    a coroutine factory for engine.run().
+    """
+    timings = timings if timings is not None else {}
+    deadline = _start(timings)
+    failures = []
+    for candidate, breaker in _attempts(model_name, timings, deadline, failures):
+        outcome = None
+        try:
+            result = engine.run(candidate, _with_timeout(make_call(candidate), deadline), timings=timings)
+            outcome = True
+            return result
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            outcome = False
+            failures.append(e)
+            print(f"[DEBUG] {candidate} failed transiently: {type(e).__name__}: {str(e)}")
+        finally:
+            breaker.record(outcome)
+    _give_up(model_name, failures)
+
+def stream(model_name, make_stream, timings=None):
+    """Stream chunks with deadline, retries, circuit breakers and fallbacks.
+
+    make_stream(model) is called in this thread for every attempt and
+    returns an async generator factory for engine.stream(). Once a chunk
+    has been yielded the text is visible, so later failures are raised
+    instead of retried.
+    """
+    timings = timings if timings is not None else {}
+    deadline = _start(timings)
+    failures = []
+    for candidate, breaker in _attempts(model_name, timings, deadline, failures):
+        outcome = None
+        emitted = False
+        try:
+            for chunk in engine.stream(candidate, _with_timeouts(make_stream(candidate), deadline), timings=timings):
+                emitted = True
+                yield chunk
+            outcome = True
+            return
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            outcome = False
+            if emitted:
+                raise
+            failures.append(e)
+            print(f"[DEBUG] {candidate} failed transiently: {type(e).__name__}: {str(e)}")
+        finally:
+            # outcome stays None if the consumer stopped the stream
+            breaker.record(outcome)
+    _give_up(model_name, failures)
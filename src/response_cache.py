@@ -0,0 +1,92 @@
+"""
+Response cache for Dr. Freud AI Chatbot.
+Reuses answers to repeated opening lines (e.g. "Hallo Dr. Freud") from an
+in-memory LRU tier backed by the shared store (see shared_state.py), so
+replicas share cached answers.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from .config import RESPONSE_CACHE_CONFIG
+from .shared_state import get_shared_store
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def _normalize(text):
+    """Normalize a message so trivial variations map to the same key."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("!?.… ")
+
+def _history_texts(message_history):
+    """Extract the text content of each part of a model message history."""
+    return [
+        _normalize(str(getattr(part, "content", "")))
+        for message in message_history or []
+        for part in message.parts
+    ]
+
+def is_cacheable(temperature, message_history):
+    """Check whether temperature and history length make reuse acceptable."""
+    if not RESPONSE_CACHE_CONFIG["enabled"]:
+        return False
+    if temperature > RESPONSE_CACHE_CONFIG["max_temperature"]:
+        return False
+    return len(message_history or []) <= RESPONSE_CACHE_CONFIG["max_history_messages"]
+
+def make_key(prompt_key, model_name, temperature, message_history, user_prompt):
+    """Build the cache key for a turn."""
+    bucket = RESPONSE_CACHE_CONFIG["temperature_bucket"]
+    payload = json.dumps([
+        prompt_key,
+        model_name,
+        round(temperature / bucket),
+        _history_texts(message_history),
+        _normalize(user_prompt)
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _remember(key, value, expires):
+    """Put an entry in the memory tier, evicting the least recently used."""
+    _memory[key] = (value, expires)
+    _memory.move_to_end(key)
+    while len(_memory) > RESPONSE_CACHE_CONFIG["max_entries"]:
+        _memory.popitem(last=False)
+
+def get(key):
+    """Get a cached response, or None on a miss."""
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None and entry[1] <= now:
+            _memory.pop(key)
+            entry = None
+    if entry is None:
+        shared = get_shared_store().get("responses", key)
+        if shared is not None:
+            entry = (shared["value"], shared["expires"])
+    with _lock:
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _remember(key, *entry)
+        _stats["hits"] += 1
+        return entry[0]
+
+def put(key, value):
+    """Store a response in both tiers."""
+    ttl = RESPONSE_CACHE_CONFIG["ttl"]
+    expires = time.time() + ttl
+    with _lock:
+        _remember(key, value, expires)
+    get_shared_store().set("responses", key, {"value": value, "expires": expires}, ttl=ttl)
+
+def get_stats():
+    """Get hit and miss counts since process start."""
+    with _lock:
+        return dict(_stats)
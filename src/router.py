@@ -0,0 +1,58 @@
+"""
+Model routing for Dr. Freud AI Chatbot.
+In "auto" mode each turn goes to the cheapest model that is capable enough
+for it (by message length, history size and web search) and currently meets
+the latency target; turns only escalate to bigger models when needed.
+"""
+
+from .config import AVAILABLE_MODELS, ROUTING_CONFIG
+from . import metrics, resilience
+
+def is_auto(model_name):
+    """Check whether a model name selects automatic routing."""
+    return ROUTING_CONFIG["enabled"] and model_name == ROUTING_CONFIG["auto_model"]
+
+def get_complexity(user_prompt, message_history):
+    """Get the lowest tier index a turn may use (0 is the cheapest tier)."""
+    chars = len(user_prompt)
+    history = len(message_history or [])
+    if chars >= ROUTING_CONFIG["complex_chars"] or history >= ROUTING_CONFIG["complex_history"]:
+        return 2
+    if chars >= ROUTING_CONFIG["medium_chars"] or history >= ROUTING_CONFIG["medium_history"]:
+        return 1
+    return 0
+
+def _get_candidates(complexity, enable_web_search):
+    """Capable models for a turn, cheapest first."""
+    tiers = [model for model in ROUTING_CONFIG["tiers"] if model in AVAILABLE_MODELS]
+    candidates = tiers[min(complexity, len(tiers) - 1):]
+    if enable_web_search:
+        candidates = [model for model in candidates if model in ROUTING_CONFIG["web_search_models"]]
+    # Skip models whose circuit breaker is open
+    available = [model for model in candidates if resilience.get_breaker(model).get_state() != "open"]
+    return available or candidates or tiers
+
+def route(user_prompt, message_history=None, enable_web_search=False):
+    """Pick the model for one turn."""
+    complexity = get_complexity(user_prompt, message_history)
+    candidates = _get_candidates(complexity, enable_web_search)
+    latencies = {
+        model: metrics.get_latency_percentile(model, 0.95, ROUTING_CONFIG["min_samples"])
+        for model in candidates
+    }
+
+    if ROUTING_CONFIG["objective"] == "fastest":
+        measured = [model for model in candidates if latencies[model] is not None]
+        # Unmeasured models are tried first, so every model gets samples
+        unmeasured = [model for model in candidates if latencies[model] is None]
+        model_name = unmeasured[0] if unmeasured else min(measured, key=latencies.get)
+    else:
+        # Unmeasured models are assumed to meet the target
+        meeting = [
+            model for model in candidates
+            if latencies[model] is None or latencies[model] <= ROUTING_CONFIG["latency_slo"]
+        ]
+        model_name = meeting[0] if meeting else min(candidates, key=latencies.get)
+
+    print(f"[DEBUG] Routed to {model_name} (complexity {complexity}, p95 {latencies[model_name]})")
+    return model_name
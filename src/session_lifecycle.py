@@ -0,0 +1,294 @@
+"""
+Session lifecycle for Dr. Freud AI Chatbot.
+Streamlit keeps the state of every open tab in memory. This tracks each
+session's last activity; a reaper thread spills the state of sessions idle
+for longer than idle_ttl to disk and releases it, and the session's next
+run rehydrates it transparently. The conversation itself is already in the
+conversation store and is reloaded from there, like a resumed session.
+
+Script entry points (the page and each fragment) are wrapped in
+session_run, so a session is never evicted while one of its runs is in
+progress.
+"""
+
+import dataclasses
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from .config import SESSION_LIFECYCLE_CONFIG
+from .prompts import SYSTEM_PROMPT
+
+# State that is not in the conversation store, spilled to disk on eviction
+SPILLED_KEYS = ("current_prompt", "last_prompt", "prompt_editor")
+
+# Debug log text areas holding copies of the conversation
+EVICTED_WIDGETS = ("debug_history", "debug_summary", "debug_prompt")
+
+# Tracked sessions by Streamlit session ID:
+# {"state", "turn_key", "runs", "last_active", "evicted"}
+_sessions = {}
+_sessions_lock = threading.Lock()
+_reaper_started = False
+
+# Streamlit internals: another session's state can only be reached through
+# private attributes, so they are only used here, and only in versions
+# they were checked against
+MIN_STREAMLIT_VERSION = (1, 40)
+_internals_supported = None
+
+def _check_internals():
+    """Check whether this Streamlit version has the internals used below."""
+    global _internals_supported
+    if _internals_supported is None:
+        try:
+            from streamlit.runtime import Runtime
+            from streamlit.runtime.state.session_state import SessionState
+            version = tuple(int(part) for part in st.__version__.split(".")[:2])
+            _internals_supported = (
+                version >= MIN_STREAMLIT_VERSION
+                and hasattr(SessionState, "filtered_state")
+                and hasattr(Runtime, "is_active_session")
+            )
+        except (ImportError, ValueError):
+            _internals_supported = False
+        if not _internals_supported:
+            print(f"[DEBUG] Session eviction disabled: unsupported Streamlit {st.__version__}")
+    return _internals_supported
+
+def _get_state(ctx):
+    """Get a run's per-session state; ctx.session_state only wraps it for one run."""
+    return getattr(ctx.session_state, "_state", None)
+
+def _get_filtered_state(state):
+    """Get the user-visible keys and values of a session's state."""
+    return state.filtered_state
+
+def _is_active(session_id):
+    """Check whether Streamlit still holds a session (it drops closed tabs)."""
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(session_id)
+
+def _is_enabled():
+    return SESSION_LIFECYCLE_CONFIG["enabled"] and _check_internals()
+
+def _get_evicted_values():
+    """Values the memory-heavy state is reset to on eviction."""
+    return {
+        "messages": [],
+        "model_messages": [],
+        "message_tokens": [],
+        "token_count": 0,
+        "summary": "",
+        "summary_tokens": 0,
+        "summarized_count": 0,
+        "last_usage": None,
+        # The default prompt is shared by all sessions
+        "current_prompt": SYSTEM_PROMPT,
+        "last_prompt": SYSTEM_PROMPT,
+        "prompt_editor": SYSTEM_PROMPT
+    }
+
+def _get_spill_path(turn_key):
+    return Path(SESSION_LIFECYCLE_CONFIG["spill_dir"]) / f"{turn_key}.json"
+
+def _write_spill(turn_key, values):
+    """Write a spill file via a temporary file, so it is never half-written."""
+    path = _get_spill_path(turn_key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(values, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _read_spill(turn_key):
+    try:
+        return json.loads(_get_spill_path(turn_key).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _deep_size(obj, seen):
+    """Approximate bytes of an object and everything it holds."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # Chat history as pydantic_ai messages
+        size += sum(_deep_size(getattr(obj, field.name, None), seen) for field in dataclasses.fields(obj))
+    return size
+
+def get_footprint(state=None):
+    """Get the approximate memory held by a session's state, in bytes (this session by default)."""
+    if state is None:
+        state = _get_state(get_script_run_ctx())
+    # Shared by all sessions, so not counted against any
+    seen = {id(SYSTEM_PROMPT)}
+    return _deep_size(_get_filtered_state(state), seen)
+
+def _evict(turn_key, state):
+    """Spill a session's state to disk and release it from memory."""
+    _write_spill(turn_key, {key: state[key] for key in SPILLED_KEYS if key in state})
+    for key, value in _get_evicted_values().items():
+        state[key] = value
+    for key in EVICTED_WIDGETS:
+        if key in state:
+            del state[key]
+
+def _rehydrate(turn_key):
+    """Restore an evicted session in its own script run."""
+    from .session_manager import resume_session
+
+    state = st.session_state
+    session_id = state.session_id
+    # Reloads the message window and running summary from the store
+    if session_id and not resume_session(session_id):
+        print(f"[DEBUG] Conversation {session_id} of evicted session {turn_key} not found")
+    spilled = _read_spill(turn_key)
+    if spilled is None:
+        print(f"[DEBUG] Spill file of session {turn_key} missing, default prompt restored")
+    else:
+        for key, value in spilled.items():
+            state[key] = value
+    _get_spill_path(turn_key).unlink(missing_ok=True)
+    print(f"[DEBUG] Rehydrated session {turn_key}")
+
+def session_run(func):
+    """Mark the session busy while a script entry point (page or fragment) runs.
+
+    Nested calls (fragments inside a full run) simply count twice.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        if ctx is None or not _is_enabled():
+            return func(*args, **kwargs)
+        state = _get_state(ctx)
+        if state is None:
+            return func(*args, **kwargs)
+        # Taking the lock waits for an eviction of this session in progress
+        with _sessions_lock:
+            entry = _sessions.get(ctx.session_id)
+            if entry is None:
+                entry = _sessions[ctx.session_id] = {"state": state, "turn_key": None, "runs": 0, "evicted": False}
+            entry["runs"] += 1
+            entry["last_active"] = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with _sessions_lock:
+                entry["runs"] -= 1
+                entry["last_active"] = time.monotonic()
+    return wrapper
+
+def touch_session():
+    """Record activity of the current session, rehydrating it if it was evicted.
+
+    Call in every run, fragment reruns included, once turn_key is set and
+    before any other session state is used.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None or not _is_enabled():
+        return
+    turn_key = st.session_state.turn_key
+    with _sessions_lock:
+        entry = _sessions.get(ctx.session_id)
+        if entry is None:
+            # Called outside session_run
+            entry = _sessions[ctx.session_id] = {"state": _get_state(ctx), "turn_key": None, "runs": 0, "evicted": False}
+        entry["turn_key"] = turn_key
+        entry["last_active"] = time.monotonic()
+        evicted = entry["evicted"]
+        entry["evicted"] = False
+    if evicted:
+        _rehydrate(turn_key)
+
+def _remove_stale_spills():
+    """Remove spill files of sessions that never returned (e.g. from before a restart)."""
+    spill_dir = Path(SESSION_LIFECYCLE_CONFIG["spill_dir"])
+    if not spill_dir.is_dir():
+        return
+    cutoff = time.time() - SESSION_LIFECYCLE_CONFIG["spill_ttl"]
+    for path in spill_dir.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+def reap_idle_sessions():
+    """Evict sessions idle for longer than idle_ttl and forget closed ones; returns how many were evicted."""
+    now = time.monotonic()
+    evicted = 0
+    # Holding the lock keeps runs from starting while a session is evicted
+    with _sessions_lock:
+        for session_id, entry in list(_sessions.items()):
+            turn_key = entry["turn_key"]
+            if not _is_active(session_id):
+                del _sessions[session_id]
+                if turn_key:
+                    _get_spill_path(turn_key).unlink(missing_ok=True)
+                continue
+            # Sessions with a run in progress (or not yet initialized) stay
+            if entry["runs"] or not turn_key or entry["evicted"]:
+                continue
+            if now - entry["last_active"] < SESSION_LIFECYCLE_CONFIG["idle_ttl"]:
+                continue
+            try:
+                footprint = get_footprint(entry["state"])
+                _evict(turn_key, entry["state"])
+            except Exception as e:
+                print(f"[DEBUG] Evicting session {turn_key} failed: {str(e)}")
+                continue
+            entry["evicted"] = True
+            evicted += 1
+            print(f"[DEBUG] Evicted idle session {turn_key} ({footprint // 1024} KB)")
+    _remove_stale_spills()
+    return evicted
+
+def get_session_stats():
+    """Get the number of resident and evicted sessions and their approximate memory in bytes."""
+    with _sessions_lock:
+        entries = list(_sessions.values())
+    stats = {"resident": 0, "evicted": 0, "bytes": 0}
+    for entry in entries:
+        stats["evicted" if entry["evicted"] else "resident"] += 1
+        stats["bytes"] += get_footprint(entry["state"])
+    return stats
+
+def _reap_forever():
+    while True:
+        time.sleep(SESSION_LIFECYCLE_CONFIG["reap_interval"])
+        try:
+            reap_idle_sessions()
+        except Exception as e:
+            print(f"[DEBUG] Session reaper failed: {str(e)}")
+
+def start_session_reaper():
+    """Start the idle-session reaper thread (once per process, if enabled)."""
+    global _reaper_started
+    if not _is_enabled():
+        return
+    with _sessions_lock:
+        if _reaper_started:
+            return
+        _reaper_started = True
+    threading.Thread(target=_reap_forever, name="session-reaper", daemon=True).start()
@@ -2,9 +2,15 @@
 Session state management for Dr. Freud AI Chatbot.
 """
 
+import uuid
 import streamlit as st
-from .config import DEFAULT_MODEL_SETTINGS
+from .config import DEFAULT_MODEL_SETTINGS, CONVERSATION_CONFIG, STARTUP_CONFIG
 from .prompts import SYSTEM_PROMPT
+from .accounting import count_tokens
+from .context_manager import reset_context
+from .conversation_store import get_conversation_store
+from .session_lifecycle import touch_session
+from .warmup import warm_session
 
 def initialize_session_state():
     """Initialize all session state variables with default values."""
@@ -13,6 +19,25 @@ def initialize_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
+    # Structured history sent to the agent, kept in step with messages
+    if "model_messages" not in st.session_state:
+        st.session_state.model_messages = []
+    
+    # Running token estimate of the conversation, total and per message
+    if "token_count" not in st.session_state:
+        st.session_state.token_count = 0
+    
+    if "message_tokens" not in st.session_state:
+        st.session_state.message_tokens = []
+    
+    # Running summary of turns folded out of the context window
+    if "summary" not in st.session_state:
+        reset_context()
+    
+    # Token usage reported by the API for the last turn
+    if "last_usage" not in st.session_state:
+        st.session_state.last_usage = None
+    
     # Model settings
     if "model_name" not in st.session_state:
         st.session_state.model_name = DEFAULT_MODEL_SETTINGS["model_name"]
@@ -33,38 +58,165 @@ def initialize_session_state():
     # Prompt editor
     if "prompt_editor" not in st.session_state:
         st.session_state.prompt_editor = st.session_state.current_prompt
+    
+    # Identifies this browser tab's turns for the per-session turn gate
+    if "turn_key" not in st.session_state:
+        st.session_state.turn_key = uuid.uuid4().hex
+    
+    # Persistent conversation: resume the one named in the URL, if any
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = None
+        st.session_state.message_offset = 0
+        resume_session(st.query_params.get("session"))
+    
+    # Track activity; restores the state if the session was evicted while idle
+    touch_session()
+    
+    # Build this session's agent and open the upstream connection in the
+    # background, so the first message does not wait for them
+    warm_session(
+        st.session_state.model_name,
+        st.session_state.temperature,
+        st.session_state.enable_web_search,
+        st.session_state.current_prompt
+    )
+
+def resume_session(session_id):
+    """Reload a persisted conversation into session state; returns False if unknown."""
+    if not session_id:
+        return False
+    store = get_conversation_store()
+    session = store.load_session(session_id)
+    if session is None:
+        return False
+    
+    # Load the unsummarized messages plus enough older ones to fill the window
+    start = min(
+        session["summarized_until"],
+        max(0, session["message_count"] - CONVERSATION_CONFIG["memory_window"])
+    )
+    start -= start % 2
+    
+    clear_conversation()
+    st.session_state.session_id = session_id
+    st.query_params["session"] = session_id
+    st.session_state.message_offset = start
+    st.session_state.current_prompt = session["prompt"]
+    st.session_state.last_prompt = session["prompt"]
+    st.session_state.prompt_editor = session["prompt"]
+    for msg in store.load_messages(session_id, start):
+        _append_in_memory(msg["role"], msg["content"])
+    if session["summary"]:
+        st.session_state.summary = session["summary"]
+        st.session_state.summary_tokens = estimate_tokens(session["summary"])
+        st.session_state.summarized_count = session["summarized_until"] - start
+    return True
 
 def update_model_settings(model_name, temperature, enable_web_search):
     """Update model settings in session state."""
     st.session_state.model_name = model_name
     st.session_state.temperature = temperature
     st.session_state.enable_web_search = enable_web_search
+    if STARTUP_CONFIG["prefetch_on_change"]:
+        # No-op unless the settings changed
+        warm_session(model_name, temperature, enable_web_search, st.session_state.current_prompt)
 
 def update_prompt(new_prompt):
     """Update the current prompt and handle related state changes."""
     if new_prompt != st.session_state.current_prompt:
         st.session_state.current_prompt = new_prompt
         
-        # If prompt has changed, clear cache and reset conversation
+        # If prompt has changed, reset conversation. Agents are keyed by
+        # prompt hash, so other sessions' warm agents stay cached.
         if st.session_state.last_prompt != st.session_state.current_prompt:
-            from .agent_manager import clear_agent_cache
-            clear_agent_cache()
-            st.session_state.messages = []
+            clear_conversation()
             st.session_state.last_prompt = st.session_state.current_prompt
+            if STARTUP_CONFIG["prefetch_on_change"]:
+                warm_session(
+                    st.session_state.model_name,
+                    st.session_state.temperature,
+                    st.session_state.enable_web_search,
+                    new_prompt
+                )
             return True
     return False
 
-def add_message(role, content):
-    """Add a message to the chat history."""
+def estimate_tokens(text):
+    """Count the tokens of a chat message for the context budget (see accounting.py)."""
+    return count_tokens(text)
+
+def _append_in_memory(role, content):
+    """Append a message to the in-memory history only."""
+    from .agent_manager import to_model_message
     st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.model_messages.append(to_model_message(role, content))
+    tokens = estimate_tokens(content)
+    st.session_state.message_tokens.append(tokens)
+    st.session_state.token_count += tokens
+
+def _trim_memory():
+    """Drop the oldest messages beyond the memory window.
+
+    Only messages already folded into the running summary are dropped, so
+    the context sent to the agent is unaffected; they stay in the store.
+    """
+    state = st.session_state
+    drop = min(len(state.messages) - CONVERSATION_CONFIG["memory_window"], state.summarized_count)
+    # Keep whole turns so the window always starts with a user message
+    drop -= drop % 2
+    if drop <= 0:
+        return
+    del state.messages[:drop]
+    del state.model_messages[:drop]
+    del state.message_tokens[:drop]
+    state.summarized_count -= drop
+    state.message_offset += drop
+
+def add_message(role, content):
+    """Add a message to the chat history and persist it."""
+    store = get_conversation_store()
+    if st.session_state.session_id is None:
+        # Sessions are created on the first message, not on every page view
+        st.session_state.session_id = store.create_session(st.session_state.current_prompt)
+        st.query_params["session"] = st.session_state.session_id
+    position = st.session_state.message_offset + len(st.session_state.messages)
+    store.append_message(st.session_state.session_id, position, role, content)
+    _append_in_memory(role, content)
+    _trim_memory()
+
+def persist_summary():
+    """Persist the running summary of the current session."""
+    if st.session_state.session_id is not None:
+        get_conversation_store().save_summary(
+            st.session_state.session_id,
+            st.session_state.summary,
+            st.session_state.message_offset + st.session_state.summarized_count
+        )
+
+def record_usage(usage):
+    """Store the token usage reported for the last turn."""
+    st.session_state.last_usage = usage
+
+def get_message_history(model_name):
+    """Get the structured message history to send to the agent, within the model's token budget."""
+    from .context_manager import get_context_window
+    return get_context_window(model_name)
 
 def get_conversation_history():
-    """Get formatted conversation history."""
+    """Get formatted conversation history (for display only)."""
     return "\n".join(
         f"{msg['role'].capitalize()}: {msg['content']}" 
         for msg in st.session_state.messages
     )
 
 def clear_conversation():
-    """Clear the conversation history."""
-    st.session_state.messages = []
\ No newline at end of file
+    """Clear the conversation history; the next message starts a new persisted session."""
+    st.session_state.session_id = None
+    st.session_state.message_offset = 0
+    if "session" in st.query_params:
+        del st.query_params["session"]
+    st.session_state.messages = []
+    st.session_state.model_messages = []
+    st.session_state.token_count = 0
+    st.session_state.message_tokens = []
+    reset_context()
@@ -0,0 +1,143 @@
+"""
+Shared state for Dr. Freud AI Chatbot.
+A small key-value interface for state that all replicas must agree on
+(cached responses, cache invalidation generations, spend counters). The SQLite backend
+lives on a volume shared by the replicas; the memory backend keeps
+everything in this process.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from .config import SHARED_STATE_CONFIG
+
+class SharedStore(ABC):
+    """Interface for shared key-value stores. Values must be JSON-serializable."""
+
+    @abstractmethod
+    def get(self, namespace, key):
+        """Get a value, or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, namespace, key, value, ttl=None):
+        """Set a value, optionally expiring after ttl seconds."""
+
+    @abstractmethod
+    def delete(self, namespace, key):
+        """Delete a value."""
+
+    @abstractmethod
+    def incr(self, namespace, key, amount=1, ttl=None):
+        """Atomically add to a number (missing counts as 0); returns the new value.
+
+        ttl only applies when the value is created; later increments keep
+        its expiry.
+        """
+
+class MemorySharedStore(SharedStore):
+    """Process-local store, for single-replica deployments and tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+                return None
+            return entry[0]
+
+    def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+                entry = (0, time.time() + ttl if ttl else None)
+            value = entry[0] + amount
+            self._data[(namespace, key)] = (value, entry[1])
+            return value
+
+class SqliteSharedStore(SharedStore):
+    """Store in a SQLite file (WAL mode) that several processes can share."""
+
+    def __init__(self, path, purge_interval=60):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Reads skip expired rows, so they are only purged now and then
+        self._purge_interval = purge_interval
+        self._purged_at = 0.0
+        self._conn = sqlite3.connect(str(path), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)")
+
+    def get(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+                (namespace, key, time.time())
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None)
+            )
+            if now - self._purged_at >= self._purge_interval:
+                self._conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+                self._purged_at = now
+
+    def delete(self, namespace, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        now = time.time()
+        with self._lock, self._conn:
+            # An expired value starts over from 0
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ? AND expires IS NOT NULL AND expires <= ?",
+                (namespace, key, now)
+            )
+            # NUMERIC keeps integers integers and allows fractional amounts
+            self._conn.execute(
+                "INSERT INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = CAST(value AS NUMERIC) + ?",
+                (namespace, key, json.dumps(amount), now + ttl if ttl else None, amount)
+            )
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0])
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_shared_store():
+    """Get the process-wide shared store selected in SHARED_STATE_CONFIG."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SHARED_STATE_CONFIG["backend"] == "sqlite":
+                _store = SqliteSharedStore(SHARED_STATE_CONFIG["sqlite_path"], SHARED_STATE_CONFIG["purge_interval"])
+            else:
+                _store = MemorySharedStore()
+    return _store
@@ -2,13 +2,17 @@
 CSS styles for Dr. Freud AI Chatbot application.
 """
 
-def get_main_styles():
-    """Get the main CSS styles for the application."""
+def get_main_styles(background_css=""):
+    """Get the main CSS styles for the application.
+
+    background_css holds the background-image declarations (see
+    assets.get_background_css); without it the page has no background image.
+    """
     return """
     <style>
     /* Main app container */
     [data-testid="stAppViewContainer"] > .main {
-        background-image: url("files/drfreud_bg.jpeg");
+        """ + background_css + """
         background-size: cover;
         background-position: center;
         background-repeat: no-repeat;
@@ -110,7 +114,8 @@ def get_main_styles():
         
         /* Hide header images on mobile to save space */
         @media (max-width: 768px) {
-            div[data-testid="stHorizontalBlock"] div[data-testid="stImage"] {
+            div[data-testid="stHorizontalBlock"] div[data-testid="stImage"],
+            .drfreud-header-image {
                 display: none;
             }
         }
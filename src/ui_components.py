@@ -3,18 +3,24 @@ UI components for Dr. Freud AI Chatbot.
 Contains reusable UI elements and layouts.
 """
 
+from pathlib import Path
 import streamlit as st
-from .config import AVAILABLE_MODELS, DEFAULT_MODEL_SETTINGS, UI_CONFIG, TEXT_CONTENT
-from .session_manager import add_message, get_conversation_history
-from .agent_manager import get_agent_response_with_context
+from .assets import get_image_html
+from .config import AVAILABLE_MODELS, DEFAULT_MODEL_SETTINGS, ROUTING_CONFIG, UI_CONFIG, TEXT_CONTENT
+from .session_manager import add_message, get_message_history, record_usage, update_prompt
+from .session_lifecycle import get_footprint, get_session_stats, session_run, touch_session
+from .edit_system_prompt import show_prompt_editor
+from .coalescing import serialized_stream
 
 def show_settings():
     """Show settings in the sidebar and return the values."""
     st.sidebar.title(TEXT_CONTENT["settings_title"])
     
+    # "auto" routes every turn to a model (see router.py)
+    models = AVAILABLE_MODELS + ([ROUTING_CONFIG["auto_model"]] if ROUTING_CONFIG["enabled"] else [])
     model_name = st.sidebar.selectbox(
         "Choose a model",
-        AVAILABLE_MODELS,
+        models,
         index=0
     )
     
@@ -39,7 +45,7 @@ def show_header():
     headercol1, headercol2, headercol3 = st.columns([1, 5, 1])
     
     with headercol1:
-        st.image(UI_CONFIG["header_images"]["left"], width=UI_CONFIG["image_width"])
+        show_header_image("left")
     
     with headercol2:
         st.markdown(f"""
@@ -47,10 +53,28 @@ def show_header():
         """, unsafe_allow_html=True)
     
     with headercol3:
-        st.image(UI_CONFIG["header_images"]["right"], width=UI_CONFIG["image_width"])
+        show_header_image("right")
 
+def show_header_image(name):
+    """Show a header image from the built, browser-cached variants."""
+    # A <picture> tag only sends URLs; st.image would re-send the full
+    # PNG over the websocket on every rerun
+    image_html = get_image_html(name, alt=TEXT_CONTENT["app_title"])
+    if image_html is not None:
+        st.markdown(image_html, unsafe_allow_html=True)
+    elif Path(UI_CONFIG["header_images"][name]).is_file():
+        st.image(UI_CONFIG["header_images"][name], width=UI_CONFIG["image_width"])
+
+# The chat panel, prompt editor and debug log are fragments: interacting
+# with one reruns only that function, not the header, sidebar and styles.
+# Changes that affect the whole page (e.g. a new prompt) call st.rerun().
+@st.fragment
+@session_run
 def show_chat_interface():
     """Show the main chat interface with a fixed layout."""
+    # Fragment reruns skip initialize_session_state
+    touch_session()
+    
     # Display chat messages from history
     message_container = st.container(height=UI_CONFIG["chat_container_height"])
     
@@ -61,45 +85,137 @@ def show_chat_interface():
     
     # Chat input
     if prompt := st.chat_input(TEXT_CONTENT["chat_placeholder"]):
+        # The LLM stack is imported on the first submission, not on first paint
+        from .agent_manager import stream_agent_response_with_context
+        
         # Display user message
         with message_container.chat_message("user"):
             st.markdown(prompt)
         
-        # Get assistant response
+        # Stream assistant response into the chat bubble as tokens arrive
         with message_container.chat_message("assistant"):
-            with st.spinner(TEXT_CONTENT["thinking_message"]):
-                # Format conversation history for context (BEFORE adding current message)
-                conversation_history = get_conversation_history()
-                
-                # Get response with conversation context
-                full_response = get_agent_response_with_context(
-                    st.session_state.model_name,
-                    st.session_state.temperature,
-                    st.session_state.enable_web_search,
-                    st.session_state.current_prompt,
-                    prompt,
-                    conversation_history
+            # Structured history for context (BEFORE adding current message)
+            message_history = get_message_history(st.session_state.model_name)
+            
+            # Set by on_usage, so a failed turn can be told apart
+            st.session_state.last_usage = None
+            # One turn per tab at a time; a rerun while streaming supersedes it
+            superseded = []
+            full_response = st.write_stream(
+                serialized_stream(
+                    st.session_state.turn_key,
+                    stream_agent_response_with_context(
+                        st.session_state.model_name,
+                        st.session_state.temperature,
+                        st.session_state.enable_web_search,
+                        st.session_state.current_prompt,
+                        prompt,
+                        message_history,
+                        on_usage=record_usage,
+                        budget_key=st.session_state.turn_key
+                    ),
+                    on_superseded=lambda: superseded.append(True)
                 )
-                st.markdown(full_response)
+            )
+        
+        # A superseded turn's partial reply is not kept, as in the API; nor
+        # is a failed or refused one (the error or refusal is already shown),
+        # so it never becomes part of the context
+        last_usage = st.session_state.last_usage
+        if superseded or (last_usage and last_usage.get("error")):
+            return
         
         # Add BOTH user message and assistant response to chat history AFTER getting response
         add_message("user", prompt)
         add_message("assistant", full_response)
 
+@st.fragment
+@session_run
+def show_prompt_panel():
+    """Show the prompt editor and apply prompt changes."""
+    touch_session()
+    updated_prompt = show_prompt_editor()
+    
+    # Update the current prompt and handle changes
+    if update_prompt(updated_prompt):
+        st.toast(TEXT_CONTENT["personality_updated"])
+        # The conversation was reset, so the whole page reruns
+        st.rerun()
+
+@st.fragment
+@session_run
 def show_agent_memory_log():
     """Show the agent's current memory in an expandable debug section."""
     from .session_manager import get_conversation_history
     
+    touch_session()
     with st.expander("🔍 Agent Memory Debug Log", expanded=False):
+        # Expander content is sent even while collapsed, so the transcript
+        # is only rendered once the log is switched on
+        if not st.toggle("Show debug details", key="debug_log_enabled"):
+            st.caption("Switch on to inspect session state, history and metrics.")
+            return
+        # Chat turns rerun only the chat panel; this refreshes the log
+        st.button("Refresh", key="debug_refresh")
+        
         st.subheader("Current Session State")
         
-        # Show current messages count
+        # Show current messages count and the memory this session holds
         message_count = len(st.session_state.messages)
-        st.metric("Total Messages", message_count)
+        count_col1, count_col2, count_col3 = st.columns(3)
+        with count_col1:
+            st.metric("Total Messages", message_count)
+        with count_col2:
+            st.metric("Estimated History Tokens", st.session_state.token_count)
+        with count_col3:
+            st.metric("Session Memory", f"{get_footprint() / 1024:.1f} KB")
+        session_stats = get_session_stats()
+        st.caption(
+            f"Sessions in this process: {session_stats['resident']} in memory, "
+            f"{session_stats['evicted']} evicted while idle, {session_stats['bytes'] / 1024:.0f} KB in total"
+        )
+        
+        # Show token usage of the last turn, including provider-side cache hits
+        last_usage = st.session_state.last_usage
+        if last_usage:
+            st.subheader("Last Turn Token Usage")
+            if last_usage.get("budget") == "exhausted":
+                st.caption("Refused, not saved: budget used up")
+            elif last_usage.get("error"):
+                st.caption(f"Failed, not saved: {last_usage['error']}")
+            elif last_usage.get("response_cache_hit"):
+                st.caption("Answered from the response cache")
+            elif last_usage.get("model"):
+                degraded = " (degraded: budget nearly used up)" if last_usage.get("budget") == "degraded" else ""
+                st.caption(f"Answered by {last_usage['model']} for ${last_usage.get('cost', 0):.5f}{degraded}")
+            usage_col1, usage_col2, usage_col3 = st.columns(3)
+            with usage_col1:
+                st.metric("Input Tokens", last_usage["input_tokens"])
+            with usage_col2:
+                st.metric("Cached Input Tokens", last_usage["cached_tokens"])
+            with usage_col3:
+                st.metric("Output Tokens", last_usage["output_tokens"])
+        
+        # Show spend this period against the session and global budgets
+        from .accounting import get_spend
+        from .config import ACCOUNTING_CONFIG
+        spend = get_spend(st.session_state.turn_key)
+        st.subheader("Token & Cost Budgets")
+        spend_columns = st.columns(4)
+        for column, (scope, metric) in zip(spend_columns, [("session", "tokens"), ("session", "cost"), ("global", "tokens"), ("global", "cost")]):
+            spent = spend[scope][metric]
+            limit = ACCOUNTING_CONFIG[f"{scope}_budget"][metric]
+            unit = "$" if metric == "cost" else ""
+            with column:
+                st.metric(
+                    f"{scope.capitalize()} {metric.capitalize()}",
+                    f"${spent:.4f}" if metric == "cost" else f"{spent:,}",
+                    help=f"Budget this period: {unit}{limit:g}" if limit is not None else "No budget"
+                )
         
         # Show conversation history
         conversation_history = get_conversation_history()
-        st.subheader("Conversation History (sent to agent)")
+        st.subheader("Conversation History (sent to agent as message history)")
         if conversation_history:
             st.text_area(
                 "Formatted History:", 
@@ -111,6 +227,17 @@ def show_agent_memory_log():
         else:
             st.info("No conversation history yet")
         
+        # Show running summary of older turns
+        if st.session_state.summary:
+            st.subheader(f"Running Summary ({st.session_state.summarized_count} messages folded)")
+            st.text_area(
+                "Summary:", 
+                st.session_state.summary, 
+                height=150,
+                disabled=True,
+                key="debug_summary"
+            )
+        
         # Show current system prompt
         st.subheader("Base System Prompt")
         st.text_area(
@@ -120,18 +247,26 @@ def show_agent_memory_log():
             disabled=True,
             key="debug_prompt"
         )
+        if st.button("Rebuild agents for this prompt", key="debug_invalidate_prompt",
+                     help="Drops pooled agents and cached responses for this prompt on every replica"):
+            from .agent_manager import get_prompt_hash, invalidate_prompt
+            invalidate_prompt(get_prompt_hash(st.session_state.current_prompt))
+            st.toast("Agents for this prompt will be rebuilt")
         
-        # Show what would be sent to agent for next message
-        if conversation_history:
-            full_system_prompt = f"{st.session_state.current_prompt}\n\nPrevious conversation:\n{conversation_history}"
-            st.subheader("Full System Prompt (next agent call)")
-            st.text_area(
-                "Complete Prompt:", 
-                full_system_prompt, 
-                height=300,
-                disabled=True,
-                key="debug_full_prompt"
-            )
+        # Show live per-turn metrics (all sessions in this process)
+        from .metrics import get_recent_turns
+        recent_turns = get_recent_turns()
+        st.subheader("Live Turn Metrics")
+        if recent_turns:
+            st.dataframe(recent_turns, use_container_width=True, hide_index=True)
+        else:
+            st.info("No turns recorded yet")
+        
+        # Show circuit breakers of models that have been called
+        from .resilience import get_breaker_states
+        breaker_states = get_breaker_states()
+        if breaker_states:
+            st.caption("Circuit breakers: " + ", ".join(f"{model} {state}" for model, state in sorted(breaker_states.items())))
         
         # Show model settings
         st.subheader("Model Settings")
@@ -0,0 +1,188 @@
+"""
+Background warm-up for Dr. Freud AI Chatbot.
+The LLM stack (pydantic_ai, openai) is only imported when it is first
+needed, so the first page paints without it. As soon as a session starts,
+the warm-up imports it, builds the agent for the session's settings and
+opens the pooled upstream connection on background threads, then keeps the
+connection alive while sessions are active, so a session's first reply is
+as fast as the following ones.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import CACHE_CONFIG, HTTP_CONFIG, ROUTING_CONFIG, STARTUP_CONFIG
+
+_executor = None
+_lock = threading.Lock()
+# When the agent for (model, temperature, web search, prompt) was last built
+_warmed_agents = {}
+_last_ping = float("-inf")
+_rehearsed = False
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STARTUP_CONFIG["warm_up_workers"], thread_name_prefix="warm-up")
+    return _executor
+
+def _build_agents(agent_key, model_name, temperature, enable_web_search, base_prompt):
+    """Build the pooled agents a turn with these settings will use."""
+    global _rehearsed
+    start = time.perf_counter()
+    try:
+        from .agent_manager import get_agent
+        # "auto" may route to any tier
+        models = ROUTING_CONFIG["tiers"] if model_name == ROUTING_CONFIG["auto_model"] else [model_name]
+        for model in models:
+            agent = get_agent(model, temperature, enable_web_search, base_prompt)
+            if agent is None:
+                raise RuntimeError(f"Agent for {model} unavailable")
+        # Once per process: the lazily built schemas are shared by all agents
+        with _lock:
+            rehearse, _rehearsed = not _rehearsed, True
+        if rehearse:
+            _rehearse_turn(agent, models[-1])
+        print(f"[DEBUG] Warmed up {', '.join(models)} in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        # Only a head start; the first turn builds the agent itself
+        print(f"[DEBUG] Warm-up failed: {str(e)}")
+        with _lock:
+            _warmed_agents.pop(agent_key, None)
+
+def _get_rehearsal_events(model_name):
+    """A minimal streamed Responses API reply, as server-sent events."""
+    message = {
+        "id": "msg_warm_up",
+        "type": "message",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": "Hm.", "annotations": []}]
+    }
+    response = {
+        "id": "resp_warm_up",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model_name,
+        "status": "in_progress",
+        "output": [],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": []
+    }
+    usage = {
+        "input_tokens": 1,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": 1,
+        "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": 2
+    }
+    part = {"item_id": message["id"], "output_index": 0, "content_index": 0}
+    events = [
+        {"type": "response.created", "response": response},
+        {"type": "response.output_item.added", "output_index": 0, "item": dict(message, status="in_progress", content=[])},
+        {"type": "response.content_part.added", **part, "part": {"type": "output_text", "text": "", "annotations": []}},
+        {"type": "response.output_text.delta", **part, "delta": "Hm.", "logprobs": []},
+        {"type": "response.output_text.done", **part, "text": "Hm.", "logprobs": []},
+        {"type": "response.content_part.done", **part, "part": message["content"][0]},
+        {"type": "response.output_item.done", "output_index": 0, "item": message},
+        {"type": "response.completed", "response": dict(response, status="completed", output=[message], usage=usage)}
+    ]
+    return "".join(
+        f"event: {event['type']}\ndata: {json.dumps(dict(event, sequence_number=i))}\n\n"
+        for i, event in enumerate(events)
+    )
+
+def _rehearse_turn(agent, model_name):
+    """Stream a canned reply through an agent, without network or cost.
+
+    pydantic_ai and the openai client build their request and event
+    schemas lazily during the first reply, which would otherwise add about
+    0.3s to the first time to first token.
+    """
+    import httpx
+    from openai import AsyncOpenAI
+    from pydantic_ai.models.openai import OpenAIResponsesModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    events = _get_rehearsal_events(model_name).encode("utf-8")
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events)
+    )
+    client = AsyncOpenAI(
+        api_key="warm-up",
+        base_url="http://warm-up.invalid/v1",
+        http_client=httpx.AsyncClient(transport=transport),
+        max_retries=0
+    )
+
+    async def rehearse():
+        try:
+            async with agent.run_stream("Guten Tag") as response:
+                async for _ in response.stream_text(delta=True):
+                    pass
+        finally:
+            await client.close()
+
+    # The override only applies in this thread's context; real turns on
+    # the engine loop keep the pooled model
+    with agent.override(model=OpenAIResponsesModel(model_name, provider=OpenAIProvider(openai_client=client))):
+        asyncio.run(rehearse())
+
+def _ping():
+    """Open (or keep open) a pooled connection to the API with a free request."""
+    global _last_ping
+    start = time.perf_counter()
+    try:
+        import openai
+        from . import engine
+        from .http_client import get_provider
+
+        async def list_models():
+            try:
+                await get_provider().client.models.list()
+            except openai.APIStatusError:
+                # Any answer means the connection is up
+                pass
+
+        # The pooled client belongs to the engine loop
+        future = asyncio.run_coroutine_threadsafe(list_models(), engine.get_loop())
+        future.result(timeout=HTTP_CONFIG["connect_timeout"] + HTTP_CONFIG["read_timeout"])
+        print(f"[DEBUG] Upstream connection warm in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"[DEBUG] Connection warm-up failed: {str(e)}")
+        with _lock:
+            _last_ping = float("-inf")
+
+def _warm_up(jobs):
+    for job in jobs:
+        job()
+
+def warm_session(model_name, temperature, enable_web_search, base_prompt):
+    """Prepare a session's next turn in the background; never blocks.
+
+    Builds the agent for these settings unless it is already pooled, and
+    pings the API if the pooled connection may have gone idle. Cheap enough
+    to call on every run.
+    """
+    global _last_ping
+    if not STARTUP_CONFIG["background_warm_up"]:
+        return
+    agent_key = (model_name, temperature, enable_web_search, hash(base_prompt))
+    now = time.monotonic()
+    jobs = []
+    with _lock:
+        # Pooled agents expire after agent_ttl
+        if now - _warmed_agents.get(agent_key, float("-inf")) > CACHE_CONFIG["agent_ttl"]:
+            for key in [key for key, built in _warmed_agents.items() if now - built > CACHE_CONFIG["agent_ttl"]]:
+                del _warmed_agents[key]
+            _warmed_agents[agent_key] = now
+            jobs.append(lambda: _build_agents(agent_key, model_name, temperature, enable_web_search, base_prompt))
+        # Idle connections close after keepalive_expiry
+        if now - _last_ping > STARTUP_CONFIG["keepalive_interval"]:
+            _last_ping = now
+            jobs.append(_ping)
+        if jobs:
+            _get_executor().submit(_warm_up, jobs)
@@ -0,0 +1,31 @@
+"""Shared fixtures: every test gets a fresh in-memory shared store."""
+
+import os
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("PYDANTIC_AI_NO_BANNER", "1")
+
+@pytest.fixture(autouse=True)
+def memory_shared_store(monkeypatch):
+    from src import shared_state
+    from src.config import ACCOUNTING_CONFIG, SHARED_STATE_CONFIG
+
+    monkeypatch.setitem(SHARED_STATE_CONFIG, "backend", "memory")
+    monkeypatch.setattr(shared_state, "_store", None)
+    # Exact counts would need the tiktoken encoding files
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "tokenizer", "estimate")
+    return shared_state.get_shared_store()
+
+@pytest.fixture(scope="session")
+def mock_openai():
+    """Start the mock Responses API; returns its settings."""
+    from benchmarks.mock_openai_server import MockSettings, start_server
+
+    server = start_server()
+    # Read when the shared OpenAI client is first created
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    MockSettings.latency = 0.0
+    MockSettings.output_tokens = 5
+    yield MockSettings
+    server.shutdown()
@@ -0,0 +1,115 @@
+"""Budget thresholds and degraded turns."""
+
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from src import accounting
+from src.config import ACCOUNTING_CONFIG, DEFAULT_MODEL_SETTINGS, ROUTING_CONFIG
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "session_budget", {"tokens": 10000, "cost": None})
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "global_budget", {"tokens": None, "cost": None})
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "degrade_at", 0.8)
+    monkeypatch.setitem(DEFAULT_MODEL_SETTINGS, "max_tokens", 1000)
+
+def spend(session_key, tokens):
+    accounting.record_usage(session_key, "gpt-4o-mini", {"input_tokens": tokens, "output_tokens": 0})
+
+def test_ok_below_degrade_threshold(budgets):
+    spend("s", 6000)
+    # 6000 spent + 100 context + 1000 max output stays below 8000
+    assert accounting.check_budget("s", "gpt-4o-mini", 100) == accounting.OK
+
+def test_degraded_when_turn_could_cross_threshold(budgets):
+    spend("s", 7000)
+    assert accounting.check_budget("s", "gpt-4o-mini", 100) == accounting.DEGRADED
+
+def test_exhausted_once_budget_used_up(budgets):
+    spend("s", 10000)
+    assert accounting.check_budget("s", "gpt-4o-mini", 100) == accounting.EXHAUSTED
+
+def test_budgets_are_per_session(budgets):
+    spend("s", 10000)
+    assert accounting.check_budget("other", "gpt-4o-mini", 100) == accounting.OK
+
+def test_global_budget_applies_to_all_sessions(budgets, monkeypatch):
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "global_budget", {"tokens": None, "cost": 0.001})
+    accounting.record_usage("s", "gpt-4o-mini", {"input_tokens": 0, "output_tokens": 2000})
+    assert accounting.get_spend("other")["global"]["cost"] == pytest.approx(0.0012)
+    assert accounting.check_budget("other", "gpt-4o-mini", 100) == accounting.EXHAUSTED
+
+def test_cost_uses_cached_input_price():
+    usage = {"input_tokens": 1000, "cached_tokens": 400, "output_tokens": 100}
+    prices = ACCOUNTING_CONFIG["prices"]["gpt-4o-mini"]
+    expected = (600 * prices["input"] + 400 * prices["cached_input"] + 100 * prices["output"]) / 1_000_000
+    assert accounting.get_cost("gpt-4o-mini", usage) == pytest.approx(expected)
+
+@pytest.mark.parametrize("enable_web_search", [False, True])
+def test_degraded_turn_keeps_web_search_working(budgets, enable_web_search):
+    from src.agent_manager import _apply_budget
+
+    spend("s", 7000)
+    state, model_name, _, _ = _apply_budget("s", "gpt-4o", enable_web_search, "Prompt", "Hallo", [])
+    assert state == accounting.DEGRADED
+    if enable_web_search:
+        assert model_name in ROUTING_CONFIG["web_search_models"]
+    else:
+        assert model_name == ACCOUNTING_CONFIG["degraded_model"]
+
+def test_other_scopes_are_counted_but_never_limited(budgets, monkeypatch):
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "global_budget", {"tokens": 5000, "cost": None})
+    accounting.record_usage(None, "gpt-4o-mini", {"input_tokens": 5000, "output_tokens": 0}, scope="eval")
+    assert accounting.get_spend(scope="eval")["eval"]["tokens"] == 5000
+    assert accounting.get_spend()["global"]["tokens"] == 0
+    assert accounting.check_budget("s", "gpt-4o-mini", 0) == accounting.OK
+
+class FakeTiktoken:
+    """Stands in for tiktoken; get_encoding blocks until released."""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.loads = 0
+
+    def encoding_for_model(self, model_name):
+        raise KeyError(model_name)
+
+    def get_encoding(self, name):
+        self.loads += 1
+        self.released.wait(5)
+        return SimpleNamespace(encode=lambda text, **kwargs: text.split())
+
+@pytest.fixture
+def fake_tiktoken(monkeypatch):
+    fake = FakeTiktoken()
+    monkeypatch.setitem(sys.modules, "tiktoken", fake)
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "tokenizer", "tiktoken")
+    monkeypatch.setattr(accounting, "_encodings", {})
+    monkeypatch.setattr(accounting, "_tiktoken_failed", False)
+    return fake
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_encoding_loads_once_in_background(fake_tiktoken):
+    text = "eins zwei drei vier fünf sechs sieben acht"
+    # Estimated while the encoding is still loading, without waiting for it
+    estimate = accounting.count_tokens(text, "gpt-4o")
+    assert accounting.count_tokens(text, "gpt-4o") == estimate
+    fake_tiktoken.released.set()
+    wait_for(lambda: accounting.count_tokens(text, "gpt-4o") == 8)
+    assert fake_tiktoken.loads == 1
+
+def test_failed_encoding_falls_back_to_estimate(fake_tiktoken, monkeypatch):
+    def fail(name):
+        raise OSError("no network")
+    monkeypatch.setattr(fake_tiktoken, "get_encoding", fail)
+    accounting.count_tokens("Hallo", "gpt-4o")
+    wait_for(lambda: accounting._tiktoken_failed)
+    assert accounting._get_encoding("gpt-4o") is None
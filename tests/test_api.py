@@ -0,0 +1,93 @@
+"""HTTP API status codes, against the mock Responses API."""
+
+import pytest
+from starlette.testclient import TestClient
+
+@pytest.fixture
+def client(mock_openai, tmp_path, monkeypatch):
+    import api
+    from src import conversation_store, preset_store, resilience
+    from src.config import CONVERSATION_CONFIG, METRICS_CONFIG, RESILIENCE_CONFIG, STARTUP_CONFIG
+
+    monkeypatch.setitem(CONVERSATION_CONFIG, "sqlite_path", str(tmp_path / "conversations.sqlite3"))
+    monkeypatch.setattr(conversation_store, "_store", None)
+    store = preset_store.FilePresetStore(tmp_path / "presets")
+    store.save("freud", "Sie sind Sigmund Freud.")
+    monkeypatch.setattr(preset_store, "_store", store)
+    monkeypatch.setitem(STARTUP_CONFIG, "background_warm_up", False)
+    monkeypatch.setitem(METRICS_CONFIG, "enabled", False)
+    monkeypatch.setitem(RESILIENCE_CONFIG, "max_attempts", 1)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    with TestClient(api.app) as client:
+        yield client
+
+@pytest.fixture
+def session_id(client):
+    response = client.post("/api/sessions", json={"preset": "freud"})
+    assert response.status_code == 201
+    return response.json()["session_id"]
+
+def test_message_is_answered_and_saved(client, session_id):
+    response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hallo"})
+    assert response.status_code == 200
+    assert response.json()["reply"]
+    messages = client.get(f"/api/sessions/{session_id}").json()["messages"]
+    assert [message["role"] for message in messages] == ["user", "assistant"]
+
+def test_stream_ends_with_done_event(client, session_id):
+    response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hallo", "stream": True})
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events[0] == "delta" and events[-1] == "done"
+
+@pytest.mark.parametrize("body", [
+    {"content": 5},
+    {"content": ""},
+    {},
+    {"content": "Hallo", "web_search": "false"},
+    {"content": "Hallo", "stream": 1},
+    {"content": "Hallo", "temperature": "warm"},
+    {"content": "Hallo", "model": "gpt-5-imaginary"}
+])
+def test_invalid_message_is_400(client, session_id, body):
+    assert client.post(f"/api/sessions/{session_id}/messages", json=body).status_code == 400
+
+@pytest.mark.parametrize("body", [{"prompt": 5}, {"preset": ["freud"]}, {"prompt": ""}])
+def test_invalid_prompt_is_400(client, body):
+    assert client.post("/api/sessions", json=body).status_code == 400
+
+def test_unknown_session_and_preset_are_404(client, session_id):
+    assert client.get("/api/sessions/missing").status_code == 404
+    assert client.post("/api/sessions/missing/messages", json={"content": "Hallo"}).status_code == 404
+    assert client.post("/api/sessions", json={"preset": "missing"}).status_code == 404
+
+def test_busy_session_is_409(client, session_id, monkeypatch):
+    from src.coalescing import session_turn
+    from src.config import COALESCING_CONFIG
+
+    monkeypatch.setitem(COALESCING_CONFIG, "supersede", "queue")
+    monkeypatch.setitem(COALESCING_CONFIG, "turn_timeout", 0.1)
+    with session_turn(session_id):
+        response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hallo"})
+    assert response.status_code == 409
+
+def test_failed_model_is_502_and_not_saved(client, session_id, mock_openai, monkeypatch):
+    monkeypatch.setattr(mock_openai, "error_rate", 1.0)
+    response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hallo"})
+    assert response.status_code == 502
+    response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hallo", "stream": True})
+    error = [line for line in response.text.splitlines() if line.startswith("event: ")][-1]
+    assert error == "event: error"
+    assert client.get(f"/api/sessions/{session_id}").json()["messages"] == []
+
+def test_refused_turn_is_429_and_not_saved(client, session_id, monkeypatch):
+    from src import accounting
+    from src.config import ACCOUNTING_CONFIG
+
+    monkeypatch.setitem(ACCOUNTING_CONFIG, "session_budget", {"tokens": 100, "cost": None})
+    accounting.record_usage(session_id, "gpt-4o-mini", {"input_tokens": 100, "output_tokens": 0})
+    response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hallo"})
+    assert response.status_code == 429
+    assert client.get(f"/api/sessions/{session_id}").json()["messages"] == []
+
+def test_presets_are_listed(client):
+    assert client.get("/api/presets").json() == {"presets": ["freud"]}
@@ -0,0 +1,128 @@
+"""Single-flight requests and serialized session turns."""
+
+import threading
+import time
+
+import pytest
+from src import coalescing
+from src.config import COALESCING_CONFIG
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+class Upstream:
+    """A fake upstream stream that records how often it ran and was closed."""
+
+    def __init__(self, chunks, error=None, delay=0.0):
+        self.chunks = chunks
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.closed = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        try:
+            for chunk in self.chunks:
+                time.sleep(self.delay)
+                yield chunk
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.closed.set()
+
+def test_follower_shares_one_request():
+    upstream = Upstream(["a", "b", "c"])
+    leader = coalescing.single_flight("k", upstream)
+    assert next(leader) == "a"
+    follower = coalescing.single_flight("k", upstream)
+    assert next(follower) == "a"
+    assert "".join(leader) == "bc"
+    assert "".join(follower) == "bc"
+    assert upstream.calls == 1
+    assert coalescing._flights == {}
+
+def test_abandoned_leader_hands_request_over():
+    upstream = Upstream(["a", "b", "c"])
+    drained = threading.Event()
+    leader = coalescing.single_flight("k", upstream, on_drained=drained.set)
+    next(leader)
+    follower = coalescing.single_flight("k", upstream)
+    next(follower)
+    leader.close()
+    assert "".join(follower) == "bc"
+    assert drained.wait(5)
+    assert coalescing._flights == {}
+
+def test_abandoned_leader_without_followers_closes_request():
+    upstream = Upstream(["a", "b", "c"])
+    leader = coalescing.single_flight("k", upstream)
+    next(leader)
+    leader.close()
+    assert upstream.closed.is_set()
+    assert coalescing._flights == {}
+
+def test_handed_over_request_stops_when_followers_leave():
+    upstream = Upstream(["a"] * 50, delay=0.01)
+    drained = threading.Event()
+    leader = coalescing.single_flight("k", upstream, on_drained=drained.set)
+    next(leader)
+    follower = coalescing.single_flight("k", upstream)
+    next(follower)
+    leader.close()
+    follower.close()
+    assert drained.wait(5)
+    assert upstream.closed.is_set()
+    assert coalescing._flights == {}
+
+def test_leader_error_reaches_followers():
+    upstream = Upstream(["a"], error=ValueError("boom"))
+    leader = coalescing.single_flight("k", upstream)
+    next(leader)
+    follower = coalescing.single_flight("k", upstream)
+    next(follower)
+    with pytest.raises(ValueError):
+        next(leader)
+    with pytest.raises(RuntimeError, match="Coalesced request failed: ValueError: boom"):
+        next(follower)
+    assert coalescing._flights == {}
+
+def test_unread_stream_leaves_no_flight():
+    upstream = Upstream(["a"])
+    coalescing.single_flight("k", upstream)
+    assert coalescing._flights == {}
+    assert upstream.calls == 0
+
+def test_newer_turn_supersedes_running_one(monkeypatch):
+    monkeypatch.setitem(COALESCING_CONFIG, "supersede", "cancel")
+    superseded = []
+    first = coalescing.serialized_stream("s", Upstream(["a", "b"])(), on_superseded=lambda: superseded.append(1))
+    assert next(first) == "a"
+    second = []
+    thread = threading.Thread(target=lambda: second.extend(coalescing.serialized_stream("s", iter(["x"]))))
+    thread.start()
+    wait_for(lambda: coalescing._gates["s"].latest == 2)
+    assert list(first) == []
+    thread.join(5)
+    assert superseded == [1]
+    assert second == ["x"]
+
+def test_handed_over_usage_is_billed_to_leader(mock_openai):
+    from src import accounting, agent_manager
+
+    def turn(budget_key):
+        return agent_manager.stream_agent_response_with_context(
+            "gpt-4o-mini", 0.3, False, "Sie sind Sigmund Freud.", "Erzählen Sie von Träumen.", budget_key=budget_key
+        )
+
+    leader = turn("leader")
+    next(leader)
+    follower = turn("follower")
+    next(follower)
+    leader.close()
+    "".join(follower)
+    wait_for(lambda: accounting.get_spend("leader")["session"]["tokens"] > 0)
+    assert accounting.get_spend("follower")["session"]["tokens"] == 0
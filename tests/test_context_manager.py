@@ -0,0 +1,37 @@
+"""Folding old turns into the running summary."""
+
+import pytest
+from src import context_manager, resilience
+from src.config import CONTEXT_CONFIG
+
+@pytest.fixture
+def failing_summarizer(monkeypatch):
+    calls = []
+
+    def run(model_name, make_call, timings=None):
+        calls.append(model_name)
+        raise resilience.DeadlineExceeded("Turn deadline exceeded")
+
+    monkeypatch.setattr(context_manager, "_summary_failed_at", float("-inf"))
+    monkeypatch.setattr(resilience, "run", run)
+    return calls
+
+def over_budget_history():
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": "Traum"} for i in range(20)]
+    return messages, [1000] * len(messages)
+
+def test_failed_summary_keeps_full_history(failing_summarizer):
+    messages, tokens = over_budget_history()
+    assert context_manager.fold_history("gpt-4o-mini", messages, tokens, "", 0, 0) == ("", 0, 0)
+    assert len(failing_summarizer) == 1
+
+def test_failed_summary_is_not_retried_every_turn(failing_summarizer, monkeypatch):
+    messages, tokens = over_budget_history()
+    context_manager.fold_history("gpt-4o-mini", messages, tokens, "", 0, 0)
+    context_manager.fold_history("gpt-4o-mini", messages, tokens, "", 0, 0)
+    assert len(failing_summarizer) == 1
+
+    # Retried once the backoff has passed
+    monkeypatch.setitem(CONTEXT_CONFIG, "summary_retry_after", 0)
+    context_manager.fold_history("gpt-4o-mini", messages, tokens, "", 0, 0)
+    assert len(failing_summarizer) == 2
@@ -0,0 +1,51 @@
+"""Concurrency limit, rate limiting and backpressure of the chat engine."""
+
+import asyncio
+import threading
+
+import pytest
+from src import engine
+from src.config import ENGINE_CONFIG
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    """Allow one request at a time, with a model whose rate limit is used up."""
+    engine.get_loop()
+    monkeypatch.setattr(engine, "_semaphore", asyncio.Semaphore(1))
+    limited = engine._RateLimiter(0.6, 1)
+    limited.tokens = 0
+    monkeypatch.setattr(engine, "_rate_limiters", {"limited-model": limited})
+
+async def answer():
+    return "ok"
+
+async def hang():
+    await asyncio.sleep(60)
+
+def test_rate_limited_request_does_not_hold_a_slot(one_slot):
+    waiting = engine.submit("limited-model", answer)
+    try:
+        assert engine.submit("other-model", answer).result(timeout=5) == "ok"
+        assert not waiting.done()
+    finally:
+        waiting.cancel()
+
+def test_full_queue_rejects_requests(monkeypatch):
+    monkeypatch.setattr(engine, "_queue_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setitem(ENGINE_CONFIG, "queue_timeout", 0.05)
+    running = engine.submit("gpt-4o-mini", hang)
+    try:
+        with pytest.raises(engine.EngineBusyError):
+            engine.submit("gpt-4o-mini", answer)
+    finally:
+        running.cancel()
+
+def test_stream_errors_reach_the_caller():
+    async def chunks():
+        yield "a"
+        raise ValueError("boom")
+
+    stream = engine.stream("gpt-4o-mini", chunks)
+    assert next(stream) == "a"
+    with pytest.raises(ValueError, match="boom"):
+        next(stream)
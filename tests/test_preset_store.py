@@ -0,0 +1,33 @@
+"""Round trips through both preset store backends."""
+
+import pytest
+from src.preset_store import FilePresetStore, SqlitePresetStore
+
+@pytest.fixture(params=["file", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "file":
+        return FilePresetStore(tmp_path / "presets")
+    return SqlitePresetStore(tmp_path / "presets.db")
+
+def test_save_list_get_delete(store):
+    assert store.list_names() == []
+    store.save("freud", "Sie sind Sigmund Freud.", author="test")
+    assert store.list_names() == ["freud"]
+    assert store.get("freud") == "Sie sind Sigmund Freud."
+    assert store.find_by_content("Sie sind Sigmund Freud.") == "freud"
+
+    store.save("freud", "Sie sind Carl Jung.", author="test")
+    assert store.get("freud") == "Sie sind Carl Jung."
+
+    assert store.delete("freud", author="test")
+    assert store.list_names() == []
+    assert store.get("freud") == ""
+    assert not store.delete("freud", author="test")
+
+def test_sqlite_history_keeps_authors(tmp_path):
+    store = SqlitePresetStore(tmp_path / "presets.db")
+    store.save("freud", "eins", author="a")
+    store.save("freud", "zwei", author="b")
+    store.delete("freud", author="c")
+    history = store.history("freud")
+    assert [(v["version"], v["author"], v["deleted"]) for v in history] == [(3, "c", True), (2, "b", False), (1, "a", False)]
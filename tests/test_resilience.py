@@ -0,0 +1,89 @@
+"""Retries, circuit breakers and fallbacks around engine calls."""
+
+import time
+
+import pytest
+from src import resilience
+from src.config import RESILIENCE_CONFIG
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setitem(RESILIENCE_CONFIG, "max_attempts", 2)
+    monkeypatch.setitem(RESILIENCE_CONFIG, "backoff_base", 0)
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+def scripted(*attempts):
+    """A make_stream whose attempts stream the given chunks; an exception is raised where it appears."""
+    calls = []
+
+    def make_stream(candidate):
+        steps = attempts[len(calls)]
+        calls.append(candidate)
+
+        async def agen():
+            for step in steps:
+                if isinstance(step, Exception):
+                    raise step
+                yield step
+        return agen
+    return make_stream, calls
+
+def test_transient_error_before_first_chunk_is_retried():
+    make_stream, calls = scripted([ConnectionError("reset")], ["ok"])
+    timings = {}
+    assert list(resilience.stream("gpt-4o-mini", make_stream, timings=timings)) == ["ok"]
+    assert calls == ["gpt-4o-mini", "gpt-4o-mini"]
+    assert timings["retries"] == 1
+
+def test_error_after_first_chunk_is_not_retried():
+    make_stream, calls = scripted(["Hallo", ConnectionError("reset")], ["ok"])
+    stream = resilience.stream("gpt-4o-mini", make_stream)
+    assert next(stream) == "Hallo"
+    with pytest.raises(ConnectionError):
+        next(stream)
+    assert calls == ["gpt-4o-mini"]
+
+def test_permanent_error_is_not_retried():
+    make_stream, calls = scripted([ValueError("bad request")], ["ok"])
+    with pytest.raises(ValueError):
+        list(resilience.stream("gpt-4o-mini", make_stream))
+    assert calls == ["gpt-4o-mini"]
+
+def test_failing_model_falls_back():
+    make_stream, calls = scripted([ConnectionError("reset")], [ConnectionError("reset")], ["ok"])
+    timings = {}
+    assert list(resilience.stream("gpt-4o-mini", make_stream, timings=timings)) == ["ok"]
+    assert calls == ["gpt-4o-mini", "gpt-4o-mini", "gpt-4.1-nano"]
+    assert timings["fallback_model"] == "gpt-4.1-nano"
+
+def test_open_breaker_skips_model(monkeypatch):
+    monkeypatch.setitem(RESILIENCE_CONFIG, "breaker_failures", 1)
+    resilience.get_breaker("gpt-4o-mini").record(False)
+    make_stream, calls = scripted(["ok"])
+    assert list(resilience.stream("gpt-4o-mini", make_stream)) == ["ok"]
+    assert calls == ["gpt-4.1-nano"]
+
+def test_breaker_opens_and_resets_after_probe():
+    breaker = resilience.CircuitBreaker(2, 0.05)
+    breaker.record(False)
+    assert breaker.get_state() == "closed"
+    breaker.record(False)
+    assert breaker.get_state() == "open"
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.get_state() == "half-open"
+    # Only one probe goes through at a time
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.get_state() == "closed"
+    assert breaker.allow()
+
+def test_failed_probe_reopens_breaker():
+    breaker = resilience.CircuitBreaker(2, 0.05)
+    breaker.record(False)
+    breaker.record(False)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.get_state() == "open"
@@ -0,0 +1,70 @@
+"""Eviction and rehydration of idle Streamlit sessions."""
+
+import pytest
+from streamlit.testing.v1 import AppTest
+from src import session_lifecycle
+from src.config import SESSION_LIFECYCLE_CONFIG
+
+@pytest.fixture
+def lifecycle(mock_openai, tmp_path, monkeypatch):
+    from src import conversation_store, preset_store
+    from src.config import CONVERSATION_CONFIG, METRICS_CONFIG, STARTUP_CONFIG
+
+    monkeypatch.setitem(CONVERSATION_CONFIG, "sqlite_path", str(tmp_path / "conversations.sqlite3"))
+    monkeypatch.setattr(conversation_store, "_store", None)
+    monkeypatch.setattr(preset_store, "_store", preset_store.FilePresetStore(tmp_path / "presets"))
+    monkeypatch.setitem(STARTUP_CONFIG, "background_warm_up", False)
+    monkeypatch.setitem(METRICS_CONFIG, "enabled", False)
+    monkeypatch.setitem(SESSION_LIFECYCLE_CONFIG, "spill_dir", str(tmp_path / "sessions"))
+    monkeypatch.setattr(session_lifecycle, "_sessions", {})
+    # Tests reap by hand
+    monkeypatch.setattr(session_lifecycle, "_reaper_started", True)
+
+def idle_now(monkeypatch):
+    monkeypatch.setitem(SESSION_LIFECYCLE_CONFIG, "idle_ttl", 0)
+
+def test_idle_session_is_evicted_and_rehydrated(lifecycle, monkeypatch):
+    at = AppTest.from_file("../app.py", default_timeout=30).run()
+    # Editing the prompt starts a new conversation, so it comes first
+    at.text_area(key="prompt_editor").set_value("Sie sind ein unsicherer Freud.").run()
+    at.chat_input[0].set_value("Hallo").run()
+    messages = list(at.session_state.messages)
+    assert len(messages) == 2
+
+    idle_now(monkeypatch)
+    assert session_lifecycle.reap_idle_sessions() == 1
+    assert at.session_state.messages == []
+    assert session_lifecycle.get_session_stats()["evicted"] == 1
+
+    at.run()
+    assert at.session_state.messages == messages
+    assert at.session_state.current_prompt == "Sie sind ein unsicherer Freud."
+    assert session_lifecycle.get_session_stats()["resident"] == 1
+
+def busy_page():
+    import streamlit as st
+    from src.session_lifecycle import reap_idle_sessions, session_run, touch_session
+
+    @session_run
+    def page():
+        st.session_state.turn_key = "busy"
+        st.session_state.messages = ["still needed"]
+        touch_session()
+        st.session_state.evicted = reap_idle_sessions()
+
+    page()
+
+def test_session_with_run_in_progress_is_not_evicted(lifecycle, monkeypatch):
+    idle_now(monkeypatch)
+    at = AppTest.from_function(busy_page).run()
+    assert at.session_state.evicted == 0
+    assert at.session_state.messages == ["still needed"]
+    # Once the run is over the session may go
+    assert session_lifecycle.reap_idle_sessions() == 1
+
+def test_disabled_on_unsupported_streamlit(lifecycle, monkeypatch):
+    monkeypatch.setattr(session_lifecycle, "MIN_STREAMLIT_VERSION", (99, 0))
+    monkeypatch.setattr(session_lifecycle, "_internals_supported", None)
+    idle_now(monkeypatch)
+    AppTest.from_function(busy_page).run()
+    assert session_lifecycle._sessions == {}
@@ -0,0 +1,42 @@
+"""Expiry in the shared key-value stores."""
+
+import pytest
+from src import shared_state
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return shared_state.SqliteSharedStore(tmp_path / "shared_state.sqlite3")
+    return shared_state.MemorySharedStore()
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_state.time, "time", lambda: now[0])
+    return now
+
+def test_expired_values_are_not_read(store, clock):
+    store.set("ns", "k", "v", ttl=10)
+    assert store.get("ns", "k") == "v"
+    clock[0] += 10
+    assert store.get("ns", "k") is None
+
+def test_expired_counter_starts_over(store, clock):
+    assert store.incr("ns", "k", 2, ttl=10) == 2
+    assert store.incr("ns", "k", 3, ttl=10) == 5
+    clock[0] += 10
+    assert store.incr("ns", "k", 1, ttl=10) == 1
+
+def rows(store):
+    return store._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+def test_sqlite_purges_expired_rows_on_an_interval(tmp_path, clock):
+    store = shared_state.SqliteSharedStore(tmp_path / "shared_state.sqlite3", purge_interval=60)
+    store.set("ns", "old", "v", ttl=1)
+    clock[0] += 10
+    store.set("ns", "new", "v")
+    # Still within the purge interval of the first write
+    assert rows(store) == 2
+    clock[0] += 60
+    store.set("ns", "new", "v")
+    assert rows(store) == 1